@@ -1,9 +1,19 @@
+import atexit
+import hashlib
 import json
+import multiprocessing
 import os
 import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
+from typing import Any, Dict, List, Optional, Tuple
+from flask import Flask, Response, abort, render_template, request, jsonify, send_file, send_from_directory, stream_with_context
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 import torch
 
@@ -14,6 +24,17 @@ app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 app.config['UPLOAD_FOLDER'] = './uploads'
 app.config['OUTPUT_FOLDER'] = './output'
+app.config['JOB_WORKERS'] = 4  # PDFs processed concurrently; uploads beyond this wait in the queue
+app.config['JOB_HISTORY'] = 200  # Finished jobs kept for status queries
+app.config['SSE_KEEPALIVE'] = 15  # Seconds between keep-alive comments on idle event streams
+app.config['CPU_POOL_WORKERS'] = None  # CPU-only hosts: None = main.NUM_WORKERS or cpu_count - 1; 0 = off
+app.config['DOC_ID_LENGTH'] = 16  # Hex digits of the content SHA-256 naming each output directory
+app.config['ALIASES_FILE'] = 'aliases.json'  # Legacy filename index, imported into the catalog once
+app.config['PDF_LIST_PAGE_SIZE'] = 100  # Default per_page for /api/pdf-list
+app.config['PDF_LIST_MAX_PAGE_SIZE'] = 1000
+
+# Concurrent jobs share the model through one batching inference thread
+extractor.USE_INFERENCE_BROKER = True
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -22,6 +43,20 @@ os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 # Global model instance
 _model = None
 
+# Processing jobs, keyed by job id (see submit_job)
+_jobs: "OrderedDict[str, ProcessingJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+_job_executor: Optional[ThreadPoolExecutor] = None
+_active_jobs: Dict[str, "ProcessingJob"] = {}  # Latest queued or running job per document id
+_document_locks = extractor.KeyedLocks()  # Held while a job or re-stitch writes a document's outputs
+
+_catalog_lock = threading.Lock()
+_catalog_synced = False
+
+# Model-preloaded page worker processes shared by all jobs on CPU-only hosts (see start_cpu_pool)
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
 
 def get_device_info() -> Dict[str, any]:
     """Get information about GPU/CPU availability."""
@@ -65,183 +100,623 @@ def device_info():
     return jsonify(get_device_info())
 
 
+# ----------------------------------------------------------------------
+# Content-addressed outputs: output/<doc id>/<doc id>.pdf, doc id from the SHA-256
+# ----------------------------------------------------------------------
+def save_upload(file) -> Tuple[Path, str]:
+    """Stream an upload into UPLOAD_FOLDER, hashing it on the way. Returns (path, sha256)."""
+    digest = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(suffix='.pdf', dir=app.config['UPLOAD_FOLDER'])
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(1 << 20)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        os.unlink(tmp_name)
+        raise
+    return Path(tmp_name), digest.hexdigest()
+
+
+def get_catalog() -> extractor.OutputCatalog:
+    """
+    Catalog of OUTPUT_FOLDER (see main.OutputCatalog). The first call in a process
+    indexes document folders the catalog doesn't know yet and imports the legacy
+    aliases file.
+    """
+    global _catalog_synced
+    output_root = Path(app.config['OUTPUT_FOLDER'])
+    catalog = extractor.get_output_catalog(output_root)
+    if catalog is None:
+        raise RuntimeError('Output catalog is disabled (main.USE_OUTPUT_CATALOG)')
+    with _catalog_lock:
+        if not _catalog_synced:
+            catalog.sync(output_root)
+            _import_aliases(catalog, output_root / app.config['ALIASES_FILE'])
+            _catalog_synced = True
+    return catalog
+
+
+def _import_aliases(catalog: extractor.OutputCatalog, path: Path):
+    """Move filenames from the aliases file used before the catalog into it."""
+    if not path.exists():
+        return
+    try:
+        aliases = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read {path.name}: {e}")
+        return
+    for doc_id, entry in aliases.items():
+        if (path.parent / doc_id).is_dir():
+            for filename in entry.get('filenames', []):
+                catalog.add_filename(doc_id, filename, entry.get('sha256'))
+    path.unlink()
+    logger.info(f"Imported {len(aliases)} entries from {path.name} into the catalog")
+
+
+def has_results(output_dir: Path, include_images: bool, include_markdown: bool) -> bool:
+    """Whether a previous run already wrote the outputs this request asks for."""
+    doc_id = output_dir.name
+    if include_images and not (output_dir / f"{doc_id}_detections.json").exists():
+        return False
+    if include_markdown and not (output_dir / f"{doc_id}.md").exists():
+        return False
+    return True
+
+
+class ProcessingJob:
+    """One uploaded PDF queued for extraction, its progress events and its outcome."""
+
+    def __init__(self, filename: str, pdf_path: Path, output_dir: Path,
+                 include_images: bool, include_markdown: bool, lazy_crops: bool = False):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.stem = pdf_path.stem
+        self.cached = False
+        self.pdf_path = pdf_path
+        self.output_dir = output_dir
+        self.include_images = include_images
+        self.include_markdown = include_markdown
+        self.lazy_crops = lazy_crops
+        self.status = 'queued'
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self._events_changed = threading.Condition()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def add_event(self, event: Dict[str, Any]):
+        """Record a progress event (see extractor.DocumentSession.emit) for streaming."""
+        event = {**event, 'elapsed': round(time.time() - self.created, 3)}
+        with self._events_changed:
+            self.events.append(event)
+            self._events_changed.notify_all()
+
+    def wait_for_events(self, index: int, timeout: float) -> List[Dict[str, Any]]:
+        """Events from `index` on, waiting up to `timeout` seconds for new ones."""
+        with self._events_changed:
+            self._events_changed.wait_for(
+                lambda: len(self.events) > index or self.is_finished, timeout
+            )
+            return self.events[index:]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'stem': self.stem,
+            'status': self.status,
+            'cached': self.cached,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+def cpu_pool_size() -> int:
+    """Worker processes for the CPU pool; 0 when the model runs on a GPU or the host is small."""
+    total_cpus = multiprocessing.cpu_count()
+    if not extractor.USE_MULTIPROCESSING or extractor.DEVICE != "cpu" or total_cpus < 4:
+        return 0
+    workers = app.config['CPU_POOL_WORKERS']
+    if workers is None:
+        workers = extractor.NUM_WORKERS or total_cpus - 1
+    return max(0, min(int(workers), total_cpus))
+
+
+def start_cpu_pool():
+    """
+    Start the page worker pool once per server process, each worker loading the
+    model at startup (extractor.init_worker). Returns None when no pool is used.
+    """
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            workers = cpu_pool_size()
+            if workers:
+                logger.info(f"Starting CPU worker pool with {workers} workers...")
+                # spawn: forking a threaded server (and torch) is unsafe
+                _cpu_pool = multiprocessing.get_context('spawn').Pool(
+                    processes=workers, initializer=extractor.init_worker
+                )
+                atexit.register(shutdown_workers)
+                logger.info("CPU worker pool ready")
+        return _cpu_pool
+
+
+def shutdown_workers():
+    """Stop taking jobs, let running ones finish, then close the CPU pool."""
+    global _cpu_pool, _job_executor
+    with _jobs_lock:
+        executor, _job_executor = _job_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    with _cpu_pool_lock:
+        pool, _cpu_pool = _cpu_pool, None
+    if pool is not None:
+        logger.info("Shutting down CPU worker pool...")
+        pool.close()
+        pool.join()
+
+
+def get_job_executor() -> ThreadPoolExecutor:
+    """Bounded pool running processing jobs, created on first upload."""
+    global _job_executor
+    with _jobs_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(
+                max_workers=max(1, app.config['JOB_WORKERS']), thread_name_prefix='job'
+            )
+        return _job_executor
+
+
+def _remember_job(job: ProcessingJob):
+    with _jobs_lock:
+        _jobs[job.id] = job
+        # Forget the oldest finished jobs; queued and running ones are always kept
+        finished = [jid for jid, j in _jobs.items() if j.status in ('done', 'failed')]
+        for jid in finished[:max(0, len(finished) - app.config['JOB_HISTORY'])]:
+            del _jobs[jid]
+
+
+def submit_job(job: ProcessingJob) -> ProcessingJob:
+    """
+    Queue a job, unless one covering the same outputs is already queued or running
+    for this document (that job is returned instead) or its outputs already exist
+    (a finished job with cached=True is returned). A job asking for more than the
+    active one runs after it (see run_job), never on the same folder at once.
+    """
+    with _jobs_lock:
+        active = _active_jobs.get(job.stem)
+        if (active is not None
+                and active.include_images >= job.include_images
+                and active.include_markdown >= job.include_markdown):
+            return active
+        cached = active is None and has_results(
+            job.output_dir, job.include_images, job.include_markdown
+        )
+        if not cached:
+            _active_jobs[job.stem] = job
+
+    _remember_job(job)
+    if cached:
+        finish_cached_job(job)
+        return job
+
+    if active is not None:
+        job.add_event({'event': 'waiting', 'job_id': active.id})
+    get_job_executor().submit(run_job, job)
+    return job
+
+
+def finish_cached_job(job: ProcessingJob):
+    """Complete a job from outputs already on disk."""
+    logger.info(f"Serving cached results for {job.filename} ({job.stem})")
+    job.cached = True
+    job.started = job.finished = time.time()
+    job.result = collect_results(job)
+    job.add_event({'event': 'done', **job.to_dict(), 'status': 'done'})
+    job.status = 'done'
+
+
+def _forget_active_job(job: ProcessingJob):
+    with _jobs_lock:
+        if _active_jobs.get(job.stem) is job:
+            del _active_jobs[job.stem]
+
+
+def get_job(job_id: str) -> Optional[ProcessingJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def output_path(stem: str, filename: Optional[str]) -> Optional[str]:
+    """Catalog path (relative to the document folder) as a path under OUTPUT_FOLDER."""
+    return f"{stem}/{filename}" if filename else None
+
+
+def collect_results(job: ProcessingJob) -> Dict[str, Any]:
+    """Summary of the outputs written for a finished job."""
+    stem = job.stem
+    doc = get_catalog().get(stem) or {}
+
+    return {
+        'filename': job.filename,
+        'stem': stem,
+        'name': doc.get('name', stem),
+        'output_dir': str(job.output_dir.relative_to(app.config['OUTPUT_FOLDER'])),
+        'figures_count': doc.get('figures_count', 0) if job.include_images else 0,
+        'tables_count': doc.get('tables_count', 0) if job.include_images else 0,
+        'elements_count': doc.get('elements_count', 0) if job.include_images else 0,
+        'annotated_pdf': output_path(stem, doc.get('annotated_pdf')) if job.include_images else None,
+        'markdown_path': output_path(stem, doc.get('markdown_path')) if job.include_markdown else None,
+        'include_images': job.include_images,
+        'include_markdown': job.include_markdown,
+    }
+
+
+def run_job(job: ProcessingJob):
+    """
+    Run a queued job on a job worker thread, once earlier jobs for the same document
+    are done. Their outputs may already cover this one, which then finishes as cached.
+    """
+    with _document_locks.hold(job.stem):
+        if has_results(job.output_dir, job.include_images, job.include_markdown):
+            _forget_active_job(job)
+            finish_cached_job(job)
+        else:
+            process_job(job)
+
+
+def process_job(job: ProcessingJob):
+    """Process one queued PDF on a job worker thread."""
+    job.status = 'running'
+    job.started = time.time()
+    job.add_event({'event': 'running', 'queued_seconds': round(job.started - job.created, 3)})
+    try:
+        logger.info(
+            f"Processing {job.filename} (images={job.include_images}, markdown={job.include_markdown})"
+        )
+        # Pool workers hold their own model; without a pool it runs in this process
+        pool = start_cpu_pool() if job.include_images else None
+        if job.include_images and pool is None:
+            load_model_once()
+
+        extractor.process_pdf_with_pool(
+            job.pdf_path,
+            job.output_dir,
+            pool=pool,
+            extract_images=job.include_images,
+            extract_markdown=job.include_markdown,
+            lazy_crops=job.lazy_crops,
+            progress=job.add_event,
+        )
+        job.result = collect_results(job)
+    except Exception as e:
+        logger.error(f"Error processing {job.filename}: {e}")
+        job.error = str(e)
+    finally:
+        job.finished = time.time()
+        status = 'failed' if job.error else 'done'
+        # The final event carries the same record as /api/jobs/<id>
+        job.add_event({'event': status, **job.to_dict(), 'status': status})
+        job.status = status
+        _forget_active_job(job)
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_files():
-    """Handle multiple PDF file uploads."""
+    """Queue uploaded PDFs for processing and return one job per file (202)."""
     if 'files[]' not in request.files:
         return jsonify({'error': 'No files provided'}), 400
     
     files = request.files.getlist('files[]')
     extraction_mode = request.form.get('extraction_mode', 'images')
     include_images = extraction_mode != 'markdown'
-    include_markdown = extraction_mode != 'images'
+    include_markdown = extraction_mode not in ('images', 'metadata')
+    # Boxes only: crops are rendered when the gallery first asks for them
+    lazy_crops = extraction_mode == 'metadata'
     
     if not files or all(f.filename == '' for f in files):
         return jsonify({'error': 'No files selected'}), 400
     
-    results = []
+    jobs = []
     
     for file in files:
         if file and file.filename.endswith('.pdf'):
             try:
-                # Save uploaded file
+                # Save uploaded file, hashing it as it streams to disk
                 filename = secure_filename(file.filename)
-                stem = Path(filename).stem
-                upload_path = Path(app.config['UPLOAD_FOLDER']) / filename
-                file.save(str(upload_path))
+                upload_path, sha256 = save_upload(file)
+                doc_id = sha256[:app.config['DOC_ID_LENGTH']]
                 
-                # Prepare output directory
-                output_dir = Path(app.config['OUTPUT_FOLDER']) / stem
+                # Outputs are keyed by content, so identical uploads share them
+                output_dir = Path(app.config['OUTPUT_FOLDER']) / doc_id
                 output_dir.mkdir(parents=True, exist_ok=True)
                 
-                # Copy PDF to output directory
-                pdf_path = output_dir / filename
-                upload_path.rename(pdf_path)
-                
-                # Process PDF
-                extractor.USE_MULTIPROCESSING = False
-                logger.info(f"Processing {filename} (images={include_images}, markdown={include_markdown})")
+                # Move PDF to output directory
+                pdf_path = output_dir / f"{doc_id}.pdf"
+                if pdf_path.exists():
+                    upload_path.unlink()
+                else:
+                    os.replace(upload_path, pdf_path)
+                get_catalog().add_filename(doc_id, filename, sha256)
                 
-                if include_images:
-                    load_model_once()
-                
-                extractor.process_pdf_with_pool(
-                    pdf_path,
-                    output_dir,
-                    pool=None,
-                    extract_images=include_images,
-                    extract_markdown=include_markdown,
+                job = ProcessingJob(
+                    filename, pdf_path, output_dir, include_images, include_markdown, lazy_crops
                 )
-                
-                # Collect results
-                json_path = output_dir / f"{stem}_content_list.json"
-                elements = []
-                if include_images and json_path.exists():
-                    elements = json.loads(json_path.read_text(encoding='utf-8'))
-                
-                annotated_pdf = None
-                if include_images:
-                    candidate_pdf = output_dir / f"{stem}_layout.pdf"
-                    if candidate_pdf.exists():
-                        annotated_pdf = str(candidate_pdf.relative_to(app.config['OUTPUT_FOLDER']))
-                
-                markdown_path = None
-                if include_markdown:
-                    candidate_md = output_dir / f"{stem}.md"
-                    if candidate_md.exists():
-                        markdown_path = str(candidate_md.relative_to(app.config['OUTPUT_FOLDER']))
-                
-                # Get figure and table counts
-                figures = [e for e in elements if e.get('type') == 'figure']
-                tables = [e for e in elements if e.get('type') == 'table']
-                
-                results.append({
-                    'filename': filename,
-                    'stem': stem,
-                    'output_dir': str(output_dir.relative_to(app.config['OUTPUT_FOLDER'])),
-                    'figures_count': len(figures),
-                    'tables_count': len(tables),
-                    'elements_count': len(elements),
-                    'annotated_pdf': annotated_pdf,
-                    'markdown_path': markdown_path,
-                    'include_images': include_images,
-                    'include_markdown': include_markdown,
-                })
+                job = submit_job(job)
+                jobs.append(job.to_dict())
                 
             except Exception as e:
-                logger.error(f"Error processing {file.filename}: {e}")
-                results.append({
+                logger.error(f"Error queuing {file.filename}: {e}")
+                jobs.append({
                     'filename': file.filename,
+                    'status': 'failed',
                     'error': str(e)
                 })
     
-    return jsonify({'results': results})
+    return jsonify({'jobs': jobs}), 202
+
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Status of all known jobs, most recent first."""
+    with _jobs_lock:
+        jobs = [job.to_dict() for job in reversed(_jobs.values())]
+    return jsonify({'jobs': jobs})
+
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status of one job; `result` holds the output summary once it is done."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job's progress: page_rendered, page_detected,
+    page_saved, markdown_page, stage (with timings), then done or failed.
+    Reconnecting clients resume after the Last-Event-ID they received.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    start = 0 if last_id is None else last_id + 1
+    keepalive = app.config['SSE_KEEPALIVE']
+
+    def stream():
+        index = start
+        while True:
+            events = job.wait_for_events(index, keepalive)
+            if not events:
+                if job.is_finished:
+                    return
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                yield f"id: {index}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                index += 1
+                if event['event'] in ('done', 'failed'):
+                    return
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def _output_dir(stem: str):
+    """Resolve an output directory for a stem, or None if it falls outside OUTPUT_FOLDER."""
+    output_root = Path(app.config['OUTPUT_FOLDER']).resolve()
+    target_dir = (output_root / stem).resolve()
+    if output_root not in target_dir.parents:
+        return None
+    return target_dir
+
+
+@app.route('/api/restitch/<path:pdf_stem>', methods=['POST'])
+def restitch_pdf(pdf_stem):
+    """
+    Re-run stitching for a processed PDF from its saved detections, with optional new
+    thresholds. Refused (409) while a job for the PDF is queued or running; crops stay
+    lazy for documents processed in "Boxes Only" mode.
+    """
+    output_dir = _output_dir(pdf_stem)
+    if output_dir is None:
+        return jsonify({'error': 'Invalid stem path'}), 400
+    pdf_path = output_dir / f"{pdf_stem}.pdf"
+    if not pdf_path.exists():
+        return jsonify({'error': 'PDF not found'}), 404
+    with _jobs_lock:
+        busy = pdf_stem in _active_jobs
+    if busy:
+        return jsonify({'error': 'PDF is still being processed; re-stitch it once the job is done'}), 409
+
+    data = request.get_json(silent=True) or {}
+    try:
+        # Jobs submitted meanwhile wait for the re-stitch (see run_job)
+        with _document_locks.hold(pdf_stem):
+            elements = extractor.restitch_document(
+                pdf_path,
+                output_dir,
+                table_tolerances=data.get('table_stitch'),
+                caption_thresholds=data.get('cross_page_caption'),
+                title_text_settings=data.get('title_text'),
+            )
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Re-stitch failed for {pdf_stem}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    if elements is None:
+        return jsonify({'error': 'No saved detections for this PDF; process it with images first'}), 409
+
+    figures = [e for e in elements if e.get('type') == 'figure']
+    tables = [e for e in elements if e.get('type') == 'table']
+    return jsonify({
+        'stem': pdf_stem,
+        'figures_count': len(figures),
+        'tables_count': len(tables),
+        'elements_count': len(elements),
+    })
+
+
+@app.route('/api/markdown-pages/<path:pdf_stem>')
+def markdown_pages(pdf_stem):
+    """Markdown pages finished so far for a PDF still being processed (?since=<page>)."""
+    output_dir = _output_dir(pdf_stem)
+    if output_dir is None:
+        return jsonify({'error': 'Invalid stem path'}), 400
+    if not output_dir.exists():
+        return jsonify({'error': 'PDF not found'}), 404
+
+    since = request.args.get('since', default=0, type=int)
+    md_path = output_dir / f"{pdf_stem}.md"
+    pages = [
+        {'page': pno + 1, 'markdown': text}
+        for pno, text in extractor.read_markdown_pages(output_dir, since=max(0, since - 1))
+    ]
+    return jsonify({
+        'stem': pdf_stem,
+        'pages': pages,
+        'complete': md_path.exists(),
+        'markdown_path': str(md_path.relative_to(app.config['OUTPUT_FOLDER'])) if md_path.exists() else None,
+    })
 
 
 @app.route('/api/pdf-list')
 def pdf_list():
-    """Get list of processed PDFs."""
-    output_dir = Path(app.config['OUTPUT_FOLDER'])
-    pdfs = []
-    
-    for item in output_dir.iterdir():
-        if item.is_dir():
-            # Check if this directory has processed content
-            json_files = list(item.glob('*_content_list.json'))
-            md_files = list(item.glob('*.md'))
-            pdf_files = list(item.glob('*.pdf'))
-            
-            if json_files or md_files or pdf_files:
-                stem = item.name
-                pdfs.append({
-                    'stem': stem,
-                    'output_dir': str(item.relative_to(app.config['OUTPUT_FOLDER'])),
-                })
-    
-    return jsonify({'pdfs': pdfs})
+    """
+    Get list of processed PDFs from the catalog.
+
+    Query parameters: page (1-based), per_page, sort (name, updated, created, pages,
+    figures, tables, elements) and order (asc or desc).
+    """
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = int(request.args.get('per_page', app.config['PDF_LIST_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+    per_page = min(max(1, per_page), app.config['PDF_LIST_MAX_PAGE_SIZE'])
+    sort = request.args.get('sort', 'updated')
+    if sort not in extractor.OutputCatalog.SORT_COLUMNS:
+        return jsonify({'error': f'Unknown sort key: {sort}'}), 400
+    descending = request.args.get('order', 'desc').lower() != 'asc'
+
+    docs, total = get_catalog().list((page - 1) * per_page, per_page, sort, descending)
+    pdfs = [
+        {
+            'stem': doc['stem'],
+            'name': doc['name'],
+            'filenames': doc['filenames'],
+            'output_dir': doc['stem'],
+            'page_count': doc['page_count'],
+            'figures_count': doc['figures_count'],
+            'tables_count': doc['tables_count'],
+            'elements_count': doc['elements_count'],
+            'updated': doc['updated'],
+        }
+        for doc in docs
+    ]
+    return jsonify({'pdfs': pdfs, 'total': total, 'page': page, 'per_page': per_page})
 
 
 @app.route('/api/pdf-details/<path:pdf_stem>')
 def pdf_details(pdf_stem):
     """Get detailed information about a processed PDF."""
-    output_dir = Path(app.config['OUTPUT_FOLDER']) / pdf_stem
-    
-    if not output_dir.exists():
+    doc = get_catalog().get(pdf_stem)
+    if doc is None:
         return jsonify({'error': 'PDF not found'}), 404
-    
-    # Load content list
-    json_files = list(output_dir.glob('*_content_list.json'))
-    elements = []
-    if json_files:
-        elements = json.loads(json_files[0].read_text(encoding='utf-8'))
-    
-    # Get figures and tables
-    figures = [e for e in elements if e.get('type') == 'figure']
-    tables = [e for e in elements if e.get('type') == 'table']
-    
-    # Get file paths
-    annotated_pdf = None
-    pdf_files = list(output_dir.glob('*_layout.pdf'))
-    if pdf_files:
-        annotated_pdf = str(pdf_files[0].relative_to(app.config['OUTPUT_FOLDER']))
-    
-    markdown_path = None
-    md_files = list(output_dir.glob('*.md'))
-    if md_files:
-        markdown_path = str(md_files[0].relative_to(app.config['OUTPUT_FOLDER']))
-    
-    # Get figure and table images
-    figure_dir = output_dir / 'figures'
-    table_dir = output_dir / 'tables'
-    
-    figure_images = []
-    if figure_dir.exists():
-        figure_images = [str(f.relative_to(app.config['OUTPUT_FOLDER'])) 
-                        for f in sorted(figure_dir.glob('*.png'))]
-    
-    table_images = []
-    if table_dir.exists():
-        table_images = [str(t.relative_to(app.config['OUTPUT_FOLDER'])) 
-                       for t in sorted(table_dir.glob('*.png'))]
-    
+
     return jsonify({
         'stem': pdf_stem,
-        'figures': figures,
-        'tables': tables,
-        'figures_count': len(figures),
-        'tables_count': len(tables),
-        'elements_count': len(elements),
-        'annotated_pdf': annotated_pdf,
-        'markdown_path': markdown_path,
-        'figure_images': figure_images,
-        'table_images': table_images,
+        'name': doc['name'],
+        'filenames': doc['filenames'],
+        'page_count': doc['page_count'],
+        'figures': doc['figures'],
+        'tables': doc['tables'],
+        'figures_count': doc['figures_count'],
+        'tables_count': doc['tables_count'],
+        'elements_count': doc['elements_count'],
+        'annotated_pdf': output_path(pdf_stem, doc['annotated_pdf']),
+        'markdown_path': output_path(pdf_stem, doc['markdown_path']),
+        'figure_images': [output_path(pdf_stem, f['image_path']) for f in doc['figures']],
+        'table_images': [output_path(pdf_stem, t['image_path']) for t in doc['tables']],
+        'figure_thumbnails': [thumbnail_paths(pdf_stem, f['image_path']) for f in doc['figures']],
+        'table_thumbnails': [thumbnail_paths(pdf_stem, t['image_path']) for t in doc['tables']],
     })
 
 
+def thumbnail_paths(stem: str, image_path: str) -> Dict[str, str]:
+    """Thumbnail size -> path under OUTPUT_FOLDER for one element image."""
+    return {
+        size: output_path(stem, extractor.thumbnail_path(image_path, size))
+        for size in extractor.THUMBNAIL_SIZES
+    }
+
+
 @app.route('/output/<path:filename>')
 def output_file(filename):
-    """Serve output files (PDFs, images, markdown)."""
-    return send_from_directory(app.config['OUTPUT_FOLDER'], filename)
+    """
+    Serve output files (PDFs, images, markdown) with ETags, answering conditional
+    requests with 304. Figure/table images not rendered yet (metadata-only runs),
+    thumbnails and the annotated layout PDF are built on first request; ?dpi= renders
+    an image at that resolution and ?pages=3-7 limits the layout PDF to those pages.
+    """
+    output_root = Path(app.config['OUTPUT_FOLDER'])
+    if safe_join(str(output_root), filename) is None:
+        abort(404)
+
+    parts = Path(filename).parts
+    if len(parts) > 2 and parts[1] in ('figures', 'tables'):
+        dpi = request.args.get('dpi', type=int)
+        if dpi is not None or not (output_root / filename).exists():
+            rendered = extractor.materialize_element_image(
+                output_root / parts[0], Path(*parts[1:]).as_posix(), dpi
+            )
+            if rendered is None:
+                abort(404)
+            filename = rendered.relative_to(output_root).as_posix()
+    elif len(parts) == 2 and parts[1].endswith('_layout.pdf'):
+        # Annotated PDFs are drawn from the saved detections on first request
+        try:
+            layout_pdf = extractor.build_layout_pdf(
+                output_root / parts[0], request.args.get('pages')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if layout_pdf is not None:
+            filename = layout_pdf.relative_to(output_root).as_posix()
+    elif len(parts) > 3 and parts[1] == extractor.THUMBNAILS_DIRNAME:
+        # <stem>/thumbnails/<size>/<image path>.webp
+        image_path = str(Path(*parts[3:]).with_suffix('.png'))
+        if extractor.ensure_thumbnail(output_root / parts[0], image_path, parts[2]) is None:
+            abort(404)
+
+    # Image paths are stable across re-stitches and lazy renders, so revalidate every use
+    response = send_from_directory(output_root, filename, max_age=0)
+    response.cache_control.no_cache = True
+    return response
 
 
 def _delete_by_stem(stem_raw: str):
@@ -262,6 +737,7 @@ def _delete_by_stem(stem_raw: str):
 
     # Delete the directory
     shutil.rmtree(target_dir, ignore_errors=False)
+    get_catalog().delete(target_dir.name)
     logger.info(f"Deleted processed output: {target_dir}")
 
     return jsonify({'ok': True, 'deleted': stem})
@@ -290,6 +766,9 @@ def delete_pdf_by_path(stem: str):
 
 
 if __name__ == '__main__':
+    # Only the serving process starts the pool, not the debug reloader's watcher
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_cpu_pool()
     app.run(debug=True, host='0.0.0.0', port=5000)
 
 
@@ -1,11 +1,25 @@
+import argparse
+import atexit
+import hashlib
+import multiprocessing
 import os
 import json
+import queue
+import re
 import signal
+import sqlite3
+import shutil
 import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional, Sequence, Set, Any
+from typing import List, Dict, Tuple, Optional, Sequence, Set, Any, Iterable, Callable
 from multiprocessing import Pool, cpu_count
-from functools import partial
 
 import fitz  # PyMuPDF (Still needed for drawing output PDF)
 import pypdfium2 as pdfium
@@ -34,9 +48,65 @@ WEIGHTS_FILE = f"doclayout_yolo_docstructbench_imgsz{MODEL_SIZE}.pt"
 # Detection settings
 CONF_THRESHOLD = 0.25
 
+# Rendering settings
+# Pages are rendered for detection at exactly MODEL_SIZE on the long side; boxes are then
+# expressed in layout pixels (LAYOUT_SCALE pixels per PDF point), the space all pixel
+# thresholds below are tuned for. Crops are separate clipped renders at CROP_SCALE.
+LAYOUT_SCALE = 2.0
+CROP_SCALE = 2.0  # Pixels per PDF point for figure/table crops (2.0 = 144 DPI)
+CROP_MEMORY_LIMIT = 512 * 1024 * 1024  # Pending crops held in RAM before spilling to temp files
+
+# Metadata-only extraction: the content list gets every box (in PDF points) but no crop is
+# rendered; materialize_element_image renders one when it is first asked for
+LAZY_CROPS = False  # CLI default; --metadata-only turns it on
+CROP_DPI_RANGE = (36, 600)  # Allowed DPI for crops rendered on request
+RENDERS_DIRNAME = "renders"  # renders/<dpi>/<image path> for crops requested at another DPI
+ELEMENT_INDEX_CACHE_SIZE = 32  # Parsed content lists kept for crops rendered on request
+
+# Annotated layout PDF: drawn from the saved detections when first requested (build_layout_pdf)
+LAZY_LAYOUT_PDF = True  # Set to False to draw it for every document during processing
+
 # Multiprocessing settings
 NUM_WORKERS = None  # None = auto (cpu_count - 1), or set to specific number like 4
 USE_MULTIPROCESSING = True  # Set to False to disable parallel processing entirely
+WORKER_DOC_CACHE_SIZE = 4  # Open PDFs each worker keeps around for later page tasks
+MAX_OPEN_DOCUMENTS = 16  # Documents the global page queue holds open at once (file handles)
+
+# Batched inference settings
+DETECT_BATCH_SIZE = None  # None = auto-tune from free device memory, or set e.g. 8
+MAX_DETECT_BATCH_SIZE = 32  # Upper bound for the auto-tuned batch size
+CPU_DETECT_BATCH_SIZE = 4  # Auto batch size when running on CPU
+
+# Inference broker: batches detection requests of concurrent callers (web server threads)
+USE_INFERENCE_BROKER = False  # Enabled by app.py; the CLI has a single caller
+BROKER_WINDOW_MS = 5  # How long the broker waits for more pages after the first one arrives
+DETECT_MEMORY_PER_IMAGE = 320 * 1024 * 1024 * (MODEL_SIZE / 1024) ** 2  # Rough GPU bytes per image
+DETECT_MEMORY_FRACTION = 0.6  # Share of free GPU memory a batch may use
+
+# Detection cache (raw model output, persisted across runs)
+USE_DETECTION_CACHE = True  # Set to False to always run the model
+DETECTION_CACHE_PATH = Path("./cache/detections.sqlite3")
+DETECTION_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Least recently used entries are evicted past this
+
+# Catalog of processed documents (SQLite in the output root, next to the document folders)
+USE_OUTPUT_CATALOG = True  # Set to False to skip recording finished documents
+OUTPUT_CATALOG_NAME = "catalog.sqlite3"
+
+# Pipelined serial processing (render → detect → save stages run concurrently)
+USE_PIPELINE = True  # Set to False to render, detect and save strictly one after another
+PIPELINE_QUEUE_SIZE = 2  # Max page batches buffered between two stages (caps memory)
+
+# Markdown extraction runs in its own processes while images are processed
+PARALLEL_MARKDOWN = True  # Set to False to extract markdown after the image pipeline
+MARKDOWN_WORKERS = None  # None = half the CPU cores; processes extracting markdown pages
+MARKDOWN_CHUNK_PAGES = 8  # Pages per markdown job; each finished chunk is streamed to disk
+MARKDOWN_PAGES_DIRNAME = "markdown_pages"  # Per-page chunks while a document is in progress
+MARKDOWN_FROM_DETECTIONS = True  # With images, build markdown from our detections, not pymupdf4llm
+
+# WebP thumbnails of figure/table images for galleries (largest first; longest side in px)
+THUMBNAIL_SIZES = {"medium": 640, "small": 200}
+THUMBNAIL_QUALITY = 80
+THUMBNAILS_DIRNAME = "thumbnails"  # thumbnails/<size>/<image path>.webp in the document folder
 
 # ----------------------------------------------------------------------
 # Color map for the layout classes
@@ -57,6 +127,23 @@ CLASS_COLORS = {
 # Global model instance (will be None in worker processes until loaded)
 _model = None
 _shutdown_requested = False
+_tuned_batch_size: Optional[int] = None  # Lowered after a CUDA out-of-memory error
+_PDFIUM_LOCK = threading.RLock()  # pdfium is not thread-safe; serializes calls across threads
+_FITZ_LOCK = threading.RLock()  # Same for PyMuPDF when several documents are processed at once
+_detection_cache = None  # DetectionCache for this process, created on first use
+_markdown_executor: Optional[ProcessPoolExecutor] = None  # Created on first parallel markdown job
+_markdown_executor_lock = threading.Lock()
+_inference_broker = None  # InferenceBroker of this process, created on first use
+_inference_broker_lock = threading.Lock()
+_output_catalogs: Dict[Path, "OutputCatalog"] = {}  # Per output root, see get_output_catalog
+_output_catalogs_lock = threading.Lock()
+_markdown_docs: "OrderedDict[Tuple[str, int, int], fitz.Document]" = OrderedDict()  # Markdown workers
+# image_path -> element per content list, keyed by (path, mtime_ns); see _find_element
+_element_indexes: "OrderedDict[Tuple[str, int], Dict[str, Dict]]" = OrderedDict()
+_element_indexes_lock = threading.Lock()
+
+# Open documents in a worker process, keyed by document identity (see document_key)
+_worker_docs: "OrderedDict[Tuple[str, int, int], pdfium.PdfDocument]" = OrderedDict()
 
 # ----------------------------------------------------------------------
 # Signal handler for graceful shutdown
@@ -77,6 +164,36 @@ def setup_signal_handlers():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
+# ----------------------------------------------------------------------
+# Per-key locks
+# ----------------------------------------------------------------------
+class KeyedLocks:
+    """
+    A lock per key (an output path, a document id), created on first use and dropped
+    once nobody holds or waits for it, so work on unrelated keys never queues up.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Any, List[Any]] = {}  # key -> [lock, holders and waiters]
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: Any):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+_layout_pdf_locks = KeyedLocks()  # One build per layout PDF; later requests find it cached
+
 # ----------------------------------------------------------------------
 # Model loader function
 # ----------------------------------------------------------------------
@@ -102,33 +219,679 @@ def init_worker():
         raise
 
 # ----------------------------------------------------------------------
-# Run layout detection on a single page image (YOLO)
+# Compact per-page detections
+# ----------------------------------------------------------------------
+DETECTION_DTYPE = np.dtype([("cls", np.uint8), ("conf", np.float32), ("bbox", np.float32, (4,))])
+
+# One shared class-name tuple per distinct table, so pages don't each carry a copy
+_CLASS_NAME_TABLES: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _intern_class_names(names: Iterable[str]) -> Tuple[str, ...]:
+    names = tuple(names)
+    return _CLASS_NAME_TABLES.setdefault(names, names)
+
+
+class PageDetections:
+    """
+    Layout detections of one page as a structured array of (class id, confidence,
+    xyxy box) records plus the class-name table; record i is detection index i.
+    Cheap to pickle and cache. Detection dicts are only built for output (to_dicts).
+    """
+
+    __slots__ = ("records", "names")
+
+    def __init__(self, records: np.ndarray, names: Iterable[str]):
+        self.records = records
+        self.names = _intern_class_names(names)
+
+    def __getstate__(self):
+        return self.records, self.names
+
+    def __setstate__(self, state):
+        self.records, names = state
+        self.names = _intern_class_names(names)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def from_result(cls, result) -> "PageDetections":
+        """Build from one YOLO result with a single device-to-host copy of its boxes."""
+        data = result.boxes.data.cpu().numpy()  # rows of x0, y0, x1, y1, [track id,] conf, cls
+        records = np.empty(len(data), dtype=DETECTION_DTYPE)
+        records["bbox"] = data[:, :4]
+        records["conf"] = data[:, -2]
+        records["cls"] = data[:, -1]
+        size = max(result.names) + 1 if result.names else 0
+        return cls(records, (result.names.get(i, "") for i in range(size)))
+
+    @classmethod
+    def from_dicts(cls, dets: Sequence[Dict]) -> "PageDetections":
+        """Rebuild from the dict shape written by to_dicts."""
+        names = sorted({d["name"] for d in dets})
+        records = np.empty(len(dets), dtype=DETECTION_DTYPE)
+        records["cls"] = [names.index(d["name"]) for d in dets]
+        records["conf"] = [d["conf"] for d in dets]
+        records["bbox"] = np.asarray([d["bbox"] for d in dets], dtype=np.float32).reshape(-1, 4)
+        return cls(records, names)
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.names).encode("utf-8") + b"\n" + self.records.tobytes()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "PageDetections":
+        header, body = payload.split(b"\n", 1)
+        records = np.frombuffer(body, dtype=DETECTION_DTYPE).copy()
+        return cls(records, json.loads(header))
+
+    def name_array(self) -> np.ndarray:
+        """Class name of every record, as an object array."""
+        return np.asarray(self.names + ("",), dtype=object)[self.records["cls"]]
+
+    def count(self, name: str) -> int:
+        if name not in self.names:
+            return 0
+        return int(np.count_nonzero(self.records["cls"] == self.names.index(name)))
+
+    def scaled(self, factor: float) -> "PageDetections":
+        """Copy with every box multiplied by factor."""
+        records = self.records.copy()
+        records["bbox"] *= factor
+        return PageDetections(records, self.names)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Detections in the dict/JSON shape used by the output files."""
+        return [
+            {"name": name, "bbox": bbox, "conf": conf, "source": "yolo", "index": i}
+            for i, (name, bbox, conf) in enumerate(zip(
+                self.name_array().tolist(),
+                self.records["bbox"].tolist(),
+                self.records["conf"].tolist(),
+            ))
+        ]
+
+# ----------------------------------------------------------------------
+# Persistent detection cache
+# ----------------------------------------------------------------------
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Hex sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """
+    On-disk cache of raw detect_page output in SQLite, stored as PageDetections bytes.
+    Entries are keyed by PDF content, page, render scale and model settings, evicted
+    least-recently-used once the stored size passes max_bytes. Hit/miss counters live
+    in the database so pool workers and repeated runs add up to one total.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS detections ("
+                " key TEXT PRIMARY KEY, dets TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS detections_last_used ON detections (last_used)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO stats (name, value) VALUES ('hits', 0), ('misses', 0)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(pdf_hash: str, page_number: int, scale: float) -> str:
+        """Cache key for one rendered page under the current model settings."""
+        parts = [
+            pdf_hash, page_number, scale, WEIGHTS_FILE, MODEL_SIZE, CONF_THRESHOLD,
+            str(DETECTION_DTYPE),
+        ]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, PageDetections]:
+        """Look up several keys at once; returns only the hits."""
+        if not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        placeholders = ",".join("?" * len(unique))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT key, dets FROM detections WHERE key IN ({placeholders})", unique
+            ).fetchall()
+            found = {key: PageDetections.from_bytes(dets) for key, dets in rows}
+            if found:
+                conn.executemany(
+                    "UPDATE detections SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key in found],
+                )
+            conn.execute(
+                "UPDATE stats SET value = value + ? WHERE name = 'hits'", (len(found),)
+            )
+            conn.execute(
+                "UPDATE stats SET value = value + ? WHERE name = 'misses'",
+                (len(unique) - len(found),),
+            )
+        return found
+
+    def put_many(self, entries: Dict[str, PageDetections]):
+        """Store detections and evict old entries past the size limit."""
+        if not entries:
+            return
+        now = time.time()
+        rows = []
+        for key, dets in entries.items():
+            payload = dets.to_bytes()
+            rows.append((key, payload, len(payload), now))
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO detections (key, dets, size, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM detections ORDER BY last_used"
+        ).fetchall():
+            conn.execute("DELETE FROM detections WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters plus current entry count and stored bytes."""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM detections"
+            ).fetchone()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+def detection_cache_keys(
+    pdf_hash: Optional[str], pages: Sequence[Tuple[int, float]]
+) -> Optional[List[str]]:
+    """Cache keys for (page number, render scale) pairs of one PDF, or None when the cache is off."""
+    if pdf_hash is None or not USE_DETECTION_CACHE:
+        return None
+    return [DetectionCache.make_key(pdf_hash, pno, scale) for pno, scale in pages]
+
+
+def lookup_detections(
+    pdf_hash: Optional[str], pages: Sequence[Tuple[int, float]]
+) -> Dict[int, PageDetections]:
+    """Cached detections by page number for (page number, render scale) pairs of one PDF."""
+    keys = detection_cache_keys(pdf_hash, pages)
+    cache = get_detection_cache() if keys is not None else None
+    if cache is None:
+        return {}
+    found = cache.get_many(keys)
+    return {pno: found[key] for (pno, _), key in zip(pages, keys) if key in found}
+
+
+def get_detection_cache() -> Optional[DetectionCache]:
+    """Detection cache for this process, or None when disabled or unavailable."""
+    global _detection_cache
+    if not USE_DETECTION_CACHE:
+        return None
+    if _detection_cache is None:
+        try:
+            _detection_cache = DetectionCache(DETECTION_CACHE_PATH, DETECTION_CACHE_MAX_BYTES)
+        except Exception as exc:
+            logger.warning(f"Detection cache unavailable ({exc}); running without it")
+            return None
+    return _detection_cache
+
+
+# ----------------------------------------------------------------------
+# Run layout detection on page images (YOLO)
 # ----------------------------------------------------------------------
-def detect_page(pil_img: Image.Image) -> List[dict]:
-    """Detect layout elements using YOLO model."""
+def get_detect_batch_size() -> int:
+    """
+    Number of pages sent through the model per forward pass.
+    Uses DETECT_BATCH_SIZE when set, otherwise sizes the batch from free device memory.
+    """
+    if DETECT_BATCH_SIZE is not None:
+        return max(1, int(DETECT_BATCH_SIZE))
+    if _tuned_batch_size is not None:
+        return _tuned_batch_size
+
+    if DEVICE != "cuda":
+        return max(1, CPU_DETECT_BATCH_SIZE)
+
+    try:
+        free_bytes, _ = torch.cuda.mem_get_info()
+    except Exception as exc:
+        logger.warning(f"Could not query free GPU memory ({exc}); using batch size 1")
+        return 1
+
+    budget = free_bytes * DETECT_MEMORY_FRACTION
+    return max(1, min(MAX_DETECT_BATCH_SIZE, int(budget // DETECT_MEMORY_PER_IMAGE)))
+
+
+def _predict_batches(
+    images: Sequence[Image.Image], batch_size: Optional[int] = None
+) -> List[PageDetections]:
+    """Run the model over the images in batches, shrinking the batch on CUDA OOM."""
+    global _tuned_batch_size
+
     model = get_model()  # Will return already-loaded model in worker
-    img_cv = np.array(pil_img)
-    results = model.predict(
-        img_cv,
-        imgsz=MODEL_SIZE,
-        conf=CONF_THRESHOLD,
-        device=DEVICE,
-        verbose=False
-    )
-    dets = []
-    for i, box in enumerate(results[0].boxes):
-        cls_id = int(box.cls.item())
-        name = results[0].names[cls_id]
-        conf = float(box.conf.item())
-        x0, y0, x1, y1 = box.xyxy[0].cpu().numpy().tolist()
-        dets.append({
-            "name": name,
-            "bbox": [x0, y0, x1, y1],
-            "conf": conf,
-            "source": "yolo",
-            "index": i
-        })
-    return dets
+    size = batch_size or get_detect_batch_size()
+    all_dets: List[PageDetections] = []
+    start = 0
+
+    while start < len(images):
+        chunk = images[start : start + size]
+        try:
+            results = model.predict(
+                [np.array(img) for img in chunk],
+                imgsz=MODEL_SIZE,
+                conf=CONF_THRESHOLD,
+                device=DEVICE,
+                verbose=False
+            )
+        except torch.cuda.OutOfMemoryError:
+            if size == 1:
+                raise
+            size = max(1, size // 2)
+            _tuned_batch_size = size
+            torch.cuda.empty_cache()
+            logger.warning(f"CUDA out of memory, retrying with batch size {size}")
+            continue
+
+        all_dets.extend(PageDetections.from_result(result) for result in results)
+        start += len(chunk)
+
+    return all_dets
+
+
+class InferenceBroker:
+    """
+    Owns model inference for a process with many concurrent callers. A single
+    thread takes the first waiting request, collects more for up to
+    BROKER_WINDOW_MS (or until a full batch is queued), runs them through the
+    model together and hands each caller its own results.
+    """
+
+    def __init__(self, window_ms: float = BROKER_WINDOW_MS, max_batch: Optional[int] = None):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._requests: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="inference-broker", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.images = 0
+
+    def predict(self, images: Sequence[Image.Image]) -> List[PageDetections]:
+        """Detections for `images`, batched with whatever other callers submit meanwhile."""
+        if threading.current_thread() is self._thread:
+            return _predict_batches(images)
+        future: Future = Future()
+        self._requests.put((list(images), future))
+        return future.result()
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join()
+
+    def _collect(self, first) -> List[Tuple[List[Image.Image], Future]]:
+        pending = [first]
+        count = len(first[0])
+        max_batch = self.max_batch or get_detect_batch_size()
+        deadline = time.perf_counter() + self.window
+        while count < max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._requests.put(None)  # Stop after serving what was collected
+                break
+            pending.append(request)
+            count += len(request[0])
+        return pending
+
+    def _run(self):
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            pending = self._collect(first)
+            images = [img for imgs, _ in pending for img in imgs]
+            try:
+                results = _predict_batches(images)
+            except BaseException as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.images += len(images)
+            start = 0
+            for imgs, future in pending:
+                future.set_result(results[start : start + len(imgs)])
+                start += len(imgs)
+
+
+def get_inference_broker() -> Optional[InferenceBroker]:
+    """The process's InferenceBroker when USE_INFERENCE_BROKER is on, else None."""
+    global _inference_broker
+    if not USE_INFERENCE_BROKER:
+        return None
+    with _inference_broker_lock:
+        if _inference_broker is None:
+            _inference_broker = InferenceBroker()
+            atexit.register(_inference_broker.close)
+        return _inference_broker
+
+
+def _run_model(images: Sequence[Image.Image], batch_size: Optional[int]) -> List[PageDetections]:
+    """Model inference for a detect_pages call, through the broker when one is active."""
+    broker = get_inference_broker()
+    if broker is None:
+        return _predict_batches(images, batch_size)
+    return broker.predict(images)
+
+
+def detect_pages(
+    images: Sequence[Image.Image],
+    batch_size: Optional[int] = None,
+    cache_keys: Optional[Sequence[str]] = None,
+) -> List[PageDetections]:
+    """
+    Detect layout elements on several page images using batched YOLO inference.
+    With cache_keys (see DetectionCache.make_key), cached pages skip the model.
+    Returns one PageDetections per input image, in input order.
+    """
+    if not images:
+        return []
+
+    cache = get_detection_cache() if cache_keys is not None else None
+    if cache is None:
+        return _run_model(images, batch_size)
+
+    cached = cache.get_many(cache_keys)
+    missing = [i for i, key in enumerate(cache_keys) if key not in cached]
+    if missing:
+        fresh = _run_model([images[i] for i in missing], batch_size)
+        cache.put_many({cache_keys[i]: dets for i, dets in zip(missing, fresh)})
+        cached.update({cache_keys[i]: dets for i, dets in zip(missing, fresh)})
+
+    return [cached[key] for key in cache_keys]
+
+
+def detect_page(pil_img: Image.Image) -> PageDetections:
+    """Detect layout elements on a single page image."""
+    return detect_pages([pil_img], batch_size=1)[0]
+
+
+def detection_scale(page_size: Tuple[float, float]) -> float:
+    """Render scale that puts a page's long side at MODEL_SIZE."""
+    return MODEL_SIZE / max(page_size[0], page_size[1], 1.0)
+
+
+def render_for_detection(page: pdfium.PdfPage) -> Tuple[Image.Image, float]:
+    """
+    Render a page with its long side at MODEL_SIZE, the resolution the model consumes.
+    Returns (image, render scale).
+    """
+    with _PDFIUM_LOCK:
+        det_scale = detection_scale(page.get_size())
+        return page.render(scale=det_scale).to_pil(), det_scale
+
+
+def plan_detection(
+    pdf: pdfium.PdfDocument, page_numbers: Iterable[int], pdf_hash: Optional[str]
+) -> Tuple[Dict[int, float], Dict[int, PageDetections]]:
+    """
+    Detection render scale of each page, from its size alone, and the cached detections
+    of those pages. Cached pages are not rendered: they go to detect_rendered_pages as
+    (page number, None, render scale) together with these detections.
+    """
+    with _PDFIUM_LOCK:
+        det_scales = {pno: detection_scale(pdf.get_page_size(pno)) for pno in page_numbers}
+    return det_scales, lookup_detections(pdf_hash, list(det_scales.items()))
+
+
+def detect_rendered_pages(
+    rendered: Sequence[Tuple[int, Optional[Image.Image], float]],
+    pdf_hash: Optional[str],
+    scale: float,
+    batch_size: Optional[int] = None,
+    cached: Optional[Dict[int, PageDetections]] = None,
+) -> List[PageDetections]:
+    """
+    Detect layout on (page number, image, render scale) triples from render_for_detection.
+    Pages in `cached` (see plan_detection) need no image; only the others go through the
+    model, and their detections are added to the cache. Without `cached` the cache is
+    looked up here. Boxes come back in layout pixels, i.e. `scale` pixels per PDF point.
+    """
+    pages = [(pno, det_scale) for pno, _, det_scale in rendered]
+    if cached is None:
+        cached = lookup_detections(pdf_hash, pages)
+    todo = [(pno, pil, det_scale) for pno, pil, det_scale in rendered if pno not in cached]
+    fresh: Dict[int, PageDetections] = {}
+    if todo:
+        todo_dets = _run_model([pil for _, pil, _ in todo], batch_size)
+        fresh = {pno: dets for (pno, _, _), dets in zip(todo, todo_dets)}
+        keys = detection_cache_keys(pdf_hash, [(pno, det_scale) for pno, _, det_scale in todo])
+        cache = get_detection_cache() if keys is not None else None
+        if cache is not None:
+            cache.put_many(dict(zip(keys, todo_dets)))
+    return [
+        (cached[pno] if pno in cached else fresh[pno]).scaled(scale / det_scale)
+        for pno, det_scale in pages
+    ]
+
+
+def clip_region(
+    page_size: Tuple[float, float],
+    bbox: Sequence[float],
+    scale: float,
+    crop_scale: Optional[float] = None,
+) -> Optional[List[float]]:
+    """
+    bbox (layout pixels at `scale` per point) in PDF points, clipped to the page.
+    None when the region is less than a pixel wide or high at crop_scale.
+    """
+    if crop_scale is None:
+        crop_scale = CROP_SCALE
+    page_width, page_height = page_size
+    x0, y0, x1, y1 = (c / scale for c in bbox)
+    x0 = min(max(0.0, x0), page_width)
+    x1 = min(max(0.0, x1), page_width)
+    y0 = min(max(0.0, y0), page_height)
+    y1 = min(max(0.0, y1), page_height)
+    if (x1 - x0) * crop_scale < 1 or (y1 - y0) * crop_scale < 1:
+        return None
+    return [x0, y0, x1, y1]
+
+
+def _region_entry(page_no: int, region: Sequence[float], **extra: Any) -> Dict[str, Any]:
+    """One page region an element image is composed of (see materialize_element_image)."""
+    return {"page": page_no, "bbox_points": [round(c, 2) for c in region], **extra}
+
+
+def render_region(
+    page: pdfium.PdfPage,
+    bbox: List[float],
+    scale: float,
+    crop_scale: Optional[float] = None,
+) -> Optional[Image.Image]:
+    """
+    Render only the bbox (layout pixels at `scale` per point) of a page, at crop_scale
+    pixels per point (CROP_SCALE by default). Returns None for an empty region.
+    """
+    if crop_scale is None:
+        crop_scale = CROP_SCALE
+
+    with _PDFIUM_LOCK:
+        page_width, page_height = page.get_size()
+        region = clip_region((page_width, page_height), bbox, scale, crop_scale)
+        if region is None:
+            return None
+        x0, y0, x1, y1 = region
+
+        # pdfium crops are margins in points: (left, bottom, right, top)
+        crop = (x0, page_height - y1, page_width - x1, y0)
+        image = page.render(scale=crop_scale, crop=crop).to_pil()
+
+    if image.mode == "CMYK":
+        image = image.convert("RGB")
+    return image
+
+
+# ----------------------------------------------------------------------
+# Document session: one set of open handles per PDF
+# ----------------------------------------------------------------------
+class DocumentSession:
+    """
+    Everything opened for one PDF, for as long as it is being processed: the
+    pypdfium2 document (rendering), the PyMuPDF document (annotation, markdown;
+    opened on first use), page count, content hash and metadata. Stages receive the
+    session instead of re-parsing the file. Pool workers are separate processes and
+    keep their own handles (see get_worker_document).
+    Progress events of all stages go to the optional `progress` callback (see emit).
+    """
+
+    def __init__(self, pdf_path: Path):
+        self.path = Path(pdf_path)
+        self.key = document_key(self.path)
+        with _PDFIUM_LOCK:
+            self.pdfium: Optional[pdfium.PdfDocument] = pdfium.PdfDocument(str(self.path))
+            self.page_count = len(self.pdfium)
+        self._fitz: Optional[fitz.Document] = None
+        self._sha256: Optional[str] = None
+        self._metadata: Optional[Dict[str, str]] = None
+        self.progress: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    def __enter__(self) -> "DocumentSession":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def emit(self, event: str, **data):
+        """
+        Send {"event": event, **data} to the progress callback. Called from the
+        pipeline threads too; callback errors never interrupt processing.
+        """
+        if self.progress is None:
+            return
+        try:
+            self.progress({"event": event, **data})
+        except Exception as exc:
+            logger.debug(f"Progress callback failed for {event}: {exc}")
+
+    @contextmanager
+    def timed_stage(self, stage: str):
+        """Emit a "stage" event with the duration of the enclosed block."""
+        start = time.perf_counter()
+        yield
+        self.emit("stage", stage=stage, seconds=round(time.perf_counter() - start, 3))
+
+    def emit_page(
+        self,
+        pno: int,
+        dets: PageDetections,
+        elements: List[Dict],
+        seconds: Optional[float] = None,
+    ):
+        """Emit "page_saved" once a page's detections have been turned into elements."""
+        self.emit(
+            "page_saved",
+            page=pno + 1,
+            pages=self.page_count,
+            detections=len(dets),
+            figures=dets.count("figure"),
+            tables=dets.count("table"),
+            elements=len(elements),
+            seconds=None if seconds is None else round(seconds, 3),
+        )
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = file_sha256(self.path)
+        return self._sha256
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        """Document info dictionary (title, author, ...), empty values skipped."""
+        if self._metadata is None:
+            with _PDFIUM_LOCK:
+                self._metadata = self.pdfium.get_metadata_dict(skip_empty=True)
+        return self._metadata
+
+    @property
+    def fitz(self) -> fitz.Document:
+        with _FITZ_LOCK:
+            if self._fitz is None:
+                self._fitz = fitz.open(str(self.path))
+            return self._fitz
+
+    def release_fitz(self):
+        """Drop the PyMuPDF document, e.g. after it was annotated in place."""
+        with _FITZ_LOCK:
+            if self._fitz is not None:
+                self._fitz.close()
+                self._fitz = None
+
+    def page(self, index: int) -> pdfium.PdfPage:
+        with _PDFIUM_LOCK:
+            return self.pdfium[index]
+
+    def page_size(self, index: int) -> Tuple[float, float]:
+        """(width, height) of a page in points, without loading the page."""
+        with _PDFIUM_LOCK:
+            return self.pdfium.get_page_size(index)
+
+    def region(self, index: int, bbox: List[float], scale: float) -> Optional[Image.Image]:
+        """Crop of a page region at CROP_SCALE, from a clipped render of just the region."""
+        page = self.page(index)
+        try:
+            return render_region(page, bbox, scale)
+        finally:
+            with _PDFIUM_LOCK:
+                page.close()
+
+    def close(self):
+        """Close both documents; safe to call more than once."""
+        self.release_fitz()
+        if self.pdfium is not None:
+            with _PDFIUM_LOCK:
+                self.pdfium.close()
+            self.pdfium = None
 
 # ----------------------------------------------------------------------
 # Crop & save figure/table regions (with captions)
@@ -141,9 +904,130 @@ def get_union_box(box1: List[float], box2: List[float]) -> List[float]:
     y1 = max(box1[3], box2[3])
     return [x0, y0, x1, y1]
 
+def _overlap_ratio_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise horizontal overlap ratio between (n, 4) and (m, 4) box arrays."""
+    left = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    right = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    overlap = right - left
+    union = (
+        np.maximum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+        - np.minimum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    )
+    valid = (overlap > 0) & (union > 0)
+    return np.divide(overlap, union, out=np.zeros_like(overlap), where=valid)
+
+
+class PageLayout:
+    """
+    Detections of one page as NumPy arrays, sorted top to bottom and built once.
+    Caption/title/text association looks up per-class row ranges and a shared
+    overlap matrix instead of re-filtering and re-sorting per element. Detection
+    dicts are only built (det) for the rows that end up in an element.
+    """
+
+    _NO_ROWS = np.empty(0, dtype=np.int64)
+
+    def __init__(self, page_dets: PageDetections):
+        records = page_dets.records
+        order = np.argsort(records["bbox"][:, 1], kind="stable")
+        self.page_dets = page_dets
+        self.boxes = records["bbox"][order].astype(np.float64)
+        self.names = page_dets.name_array()[order]
+        self.indices = order.astype(np.int64)
+        self.tops = self.boxes[:, 1]
+        self.bottoms = self.boxes[:, 3]
+        # Layout row of every detection index
+        self.row_of = np.empty_like(self.indices)
+        self.row_of[order] = np.arange(len(order))
+        # Row-vs-row overlap, shared by every caption/text chain on the page
+        self.overlap = _overlap_ratio_matrix(self.boxes, self.boxes)
+        self._class_rows = {
+            name: np.flatnonzero(self.names == name) for name in set(self.names.tolist())
+        }
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def det(self, row: int) -> Dict[str, Any]:
+        """Detection dict of one row, in the PageDetections.to_dicts shape."""
+        index = int(self.indices[row])
+        record = self.page_dets.records[index]
+        return {
+            "name": self.names[row],
+            "bbox": record["bbox"].tolist(),
+            "conf": float(record["conf"]),
+            "source": "yolo",
+            "index": index,
+        }
+
+    def class_rows(
+        self, name: str, min_top: float = -np.inf, max_top: float = np.inf
+    ) -> np.ndarray:
+        """Rows of one class with min_top <= top <= max_top, top to bottom."""
+        rows = self._class_rows.get(name, self._NO_ROWS)
+        tops = self.tops[rows]
+        lo = np.searchsorted(tops, min_top, side="left")
+        hi = np.searchsorted(tops, max_top, side="right")
+        return rows[lo:hi]
+
+    def overlap_with(self, box: Sequence[float]) -> np.ndarray:
+        """Horizontal overlap ratio of every row with an arbitrary box."""
+        return _overlap_ratio_matrix(np.asarray([box], dtype=np.float64), self.boxes)[0]
+
+    def overlap_of(self, det: Dict) -> np.ndarray:
+        """Overlap of every row with a detection of this page (its overlap matrix row)."""
+        return self.overlap[self.row_of[det["index"]]]
+
+    def is_free(self, row: int, used_indices: Set[int]) -> bool:
+        index = int(self.indices[row])
+        return index >= 0 and index not in used_indices
+
+    def available(self, used_indices: Set[int]) -> np.ndarray:
+        """Mask of rows with a detection index that is not in used_indices."""
+        mask = self.indices >= 0
+        if used_indices:
+            mask &= ~np.isin(self.indices, np.fromiter(used_indices, dtype=np.int64))
+        return mask
+
+    def texts_below_title(
+        self,
+        title_row: int,
+        used_indices: Set[int],
+        settings: Dict[str, float],
+    ) -> List[Dict]:
+        """Contiguous text rows under a title, stopping at the next free title."""
+        end = len(self)
+        title_rows = self._class_rows.get("title", self._NO_ROWS)
+        for row in title_rows[np.searchsorted(title_rows, title_row, side="right"):]:
+            if self.is_free(row, used_indices):
+                end = row
+                break
+
+        text_rows = self._class_rows.get("text", self._NO_ROWS)
+        text_rows = text_rows[
+            np.searchsorted(text_rows, title_row, side="right"):
+            np.searchsorted(text_rows, end, side="left")
+        ]
+        overlaps = self.overlap[title_row]
+        title_top = self.tops[title_row]
+
+        texts: List[Dict] = []
+        last_bottom = self.bottoms[title_row]
+        for row in text_rows:
+            if not self.is_free(row, used_indices) or self.tops[row] < title_top:
+                continue
+            if self.tops[row] - last_bottom > settings["max_text_gap"]:
+                break
+            if overlaps[row] < settings["min_overlap"]:
+                continue
+            texts.append(self.det(row))
+            last_bottom = self.bottoms[row]
+        return texts
+
+
 def collect_caption_elements(
     element: Dict,
-    all_dets: List[Dict],
+    layout: PageLayout,
     target_name: str,
     max_vertical_gap: float = 60.0,
     min_overlap: float = 0.25,
@@ -152,40 +1036,26 @@ def collect_caption_elements(
     Collect contiguous caption detections directly below a figure/table.
     """
     base_box = element["bbox"]
-    base_bottom = base_box[3]
-    selected: List[Dict] = []
-    last_bottom = base_bottom
+    last_bottom = base_box[3]
+    rows = layout.class_rows(target_name, min_top=base_box[3] - 5)
+    base_overlaps = layout.overlap_of(element)
 
-    relevant = [
-        d for d in all_dets
-        if d["name"] == target_name and d["bbox"][1] >= base_bottom - 5
-    ]
-
-    relevant.sort(key=lambda d: d["bbox"][1])
-
-    for cand in relevant:
-        cand_box = cand["bbox"]
-        top = cand_box[1]
-        if selected and top - last_bottom > max_vertical_gap:
+    selected: List[int] = []
+    for row in rows:
+        if selected and layout.tops[row] - last_bottom > max_vertical_gap:
             break
-
-        if selected:
-            overlap = _horizontal_overlap_ratio(selected[-1]["bbox"], cand_box)
-        else:
-            overlap = _horizontal_overlap_ratio(base_box, cand_box)
-
+        overlap = layout.overlap[selected[-1], row] if selected else base_overlaps[row]
         if overlap < min_overlap:
             continue
+        selected.append(row)
+        last_bottom = layout.bottoms[row]
 
-        selected.append(cand)
-        last_bottom = cand_box[3]
-
-    return selected
+    return [layout.det(row) for row in selected]
 
 
 def collect_title_and_text_segments(
     element: Dict,
-    all_dets: List[Dict],
+    layout: PageLayout,
     processed_indices: Set[int],
     settings: Optional[Dict[str, float]] = None,
 ) -> Tuple[List[Dict], List[Dict]]:
@@ -198,79 +1068,53 @@ def collect_title_and_text_segments(
     if not element.get("bbox"):
         return [], []
 
-    figure_box = element["bbox"]
-    figure_bottom = figure_box[3]
-
-    candidates = [
-        d for d in all_dets
-        if d.get("bbox") and d["index"] not in processed_indices
-    ]
-    candidates.sort(key=lambda d: d["bbox"][1])
-
-    titles: List[Dict] = []
-    texts: List[Dict] = []
-
-    for idx, det in enumerate(candidates):
-        if det["name"] != "title":
-            continue
+    figure_bottom = element["bbox"][3]
+    overlaps = layout.overlap_of(element)
 
-        title_box = det["bbox"]
-        if title_box[1] < figure_bottom - 5:
+    # Titles past max_title_gap end the search, so only this top range qualifies
+    for row in layout.class_rows(
+        "title", figure_bottom - 5, figure_bottom + settings["max_title_gap"]
+    ):
+        if not layout.is_free(row, processed_indices):
             continue
-
-        vertical_gap = title_box[1] - figure_bottom
-        if vertical_gap > settings["max_title_gap"]:
-            break
-
-        overlap = _horizontal_overlap_ratio(figure_box, title_box)
-        if overlap < settings["min_overlap"]:
+        if overlaps[row] < settings["min_overlap"]:
             continue
+        texts = layout.texts_below_title(row, processed_indices, settings)
+        return [layout.det(row)], texts
 
-        titles.append(det)
-        last_bottom = title_box[3]
-
-        for follower in candidates[idx + 1 :]:
-            if follower["name"] == "title":
-                break
-            if follower["name"] != "text":
-                continue
-            text_box = follower["bbox"]
-            if text_box[1] < title_box[1]:
-                continue
-
-            gap = text_box[1] - last_bottom
-            if gap > settings["max_text_gap"]:
-                break
-
-            if _horizontal_overlap_ratio(title_box, text_box) < settings["min_overlap"]:
-                continue
-
-            texts.append(follower)
-            last_bottom = text_box[3]
+    return [], []
 
-        break
-
-    return titles, texts
 
+def save_layout_elements(page: pdfium.PdfPage, page_num: int, 
+                         dets: PageDetections, out_dir: Path,
+                         title_text_settings: Optional[Dict[str, float]] = None,
+                         scale: float = LAYOUT_SCALE,
+                         lazy_crops: bool = False) -> List[dict]:
+    """
+    Crop figure and table regions, merging captions.
+    Each crop is its own clipped render of the page at CROP_SCALE. Crops are not written
+    here: each element carries its image under "_image" until write_element_images.
+    With lazy_crops nothing is rendered; elements only carry their regions.
+    """
+    with _PDFIUM_LOCK:
+        page_size = page.get_size()
+    page_width, page_height = (int(round(v * scale)) for v in page_size)
 
-def save_layout_elements(pil_img: Image.Image, page_num: int, 
-                         dets: List[dict], out_dir: Path) -> List[dict]:
-    """Save figure and table crops, merging captions."""
     fig_dir = out_dir / "figures"
     tab_dir = out_dir / "tables"
-    os.makedirs(fig_dir, exist_ok=True)
-    os.makedirs(tab_dir, exist_ok=True)
 
     infos = []
     fig_count = 0
     tab_count = 0
     
     processed_indices = set()
+    layout = PageLayout(dets)
 
-    for i, d in enumerate(dets):
-        if d["index"] in processed_indices:
+    for i in range(len(dets)):
+        if i in processed_indices:
             continue
         
+        d = layout.det(layout.row_of[i])
         name = d["name"].lower()
         final_box = d["bbox"]
         caption_segments: List[Dict] = []
@@ -281,12 +1125,12 @@ def save_layout_elements(pil_img: Image.Image, page_num: int,
             elem_type = "figure"
             path_template = fig_dir / f"page_{page_num + 1}_fig_{fig_count}.png"
             fig_count += 1
-            caption_segments = collect_caption_elements(d, dets, "figure_caption")
+            caption_segments = collect_caption_elements(d, layout, "figure_caption")
             for cap in caption_segments:
                 final_box = get_union_box(final_box, cap["bbox"])
                 processed_indices.add(cap["index"])
             title_segments, text_segments = collect_title_and_text_segments(
-                d, dets, processed_indices
+                d, layout, processed_indices, title_text_settings
             )
             for seg in title_segments + text_segments:
                 final_box = get_union_box(final_box, seg["bbox"])
@@ -296,33 +1140,38 @@ def save_layout_elements(pil_img: Image.Image, page_num: int,
             elem_type = "table"
             path_template = tab_dir / f"page_{page_num + 1}_tab_{tab_count}.png"
             tab_count += 1
-            caption_segments = collect_caption_elements(d, dets, "table_caption")
+            caption_segments = collect_caption_elements(d, layout, "table_caption")
             for cap in caption_segments:
                 final_box = get_union_box(final_box, cap["bbox"])
                 processed_indices.add(cap["index"])
         else:
             continue
             
-        x0, y0, x1, y1 = map(int, final_box)
-        crop = pil_img.crop((x0, y0, x1, y1))
-        
-        if crop.mode == "CMYK":
-            crop = crop.convert("RGB")
-            
-        crop.save(path_template)
+        region = clip_region(page_size, final_box, scale)
+        if region is None:
+            continue
+        crop = None
+        if not lazy_crops:
+            crop = render_region(page, final_box, scale)
+            if crop is None:
+                continue
         
         info_data = {
             "type": elem_type,
             "page": page_num + 1,
             "bbox_pixels": final_box,
+            "bbox_points": [round(c, 2) for c in region],
+            "regions": [_region_entry(page_num + 1, region)],
             "conf": d["conf"],
             "source": d.get("source", "yolo"),
             "image_path": str(path_template.relative_to(out_dir)),
-            "width": int(x1 - x0),
-            "height": int(y1 - y0),
-            "page_width": pil_img.width,
-            "page_height": pil_img.height,
+            "width": crop.width if crop is not None else None,
+            "height": crop.height if crop is not None else None,
+            "page_width": page_width,
+            "page_height": page_height,
         }
+        if crop is not None:
+            info_data["_image"] = crop
         if caption_segments:
             info_data["captions"] = [
                 {
@@ -384,37 +1233,356 @@ TITLE_TEXT_ASSOCIATION = {
 }
 
 
-def _horizontal_overlap_ratio(box1: List[float], box2: List[float]) -> float:
-    """Compute horizontal overlap ratio between two bounding boxes."""
-    x_left = max(box1[0], box2[0])
-    x_right = min(box1[2], box2[2])
-    overlap = max(0.0, x_right - x_left)
-    if overlap <= 0:
-        return 0.0
-    width_union = max(box1[2], box2[2]) - min(box1[0], box2[0])
-    if width_union <= 0:
-        return 0.0
-    return overlap / width_union
-
-
-def _bbox_to_rect(bbox: List[float]) -> Tuple[int, int, int, int]:
-    """Convert [x0, y0, x1, y1] into (x, y, w, h)."""
-    x0, y0, x1, y1 = bbox
-    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
-
+class CropStore:
+    """
+    Figure/table crops waiting for their single final encode.
+    Images stay in memory up to max_bytes; older ones past that are spilled to
+    uncompressed .npy files in a temp directory and loaded back on access.
+    """
 
-def _open_table_image(elem: Dict, out_dir: Path) -> Optional[Image.Image]:
-    """Open a table image relative to the output directory."""
-    image_path = out_dir / elem["image_path"]
-    if not image_path.exists():
-        logger.warning(f"Missing table crop for stitching: {image_path}")
+    def __init__(self, max_bytes: int = CROP_MEMORY_LIMIT):
+        self.max_bytes = max_bytes
+        self._images: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._spilled: Dict[str, Path] = {}
+        self._bytes = 0
+        self._next_id = 0
+        self._spill_dir: Optional[Path] = None
+
+    @staticmethod
+    def _size(image: Image.Image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    def put(self, image: Image.Image) -> str:
+        """Store an image and return its key."""
+        key = f"crop{self._next_id}"
+        self._next_id += 1
+        self._store(key, image)
+        return key
+
+    def _store(self, key: str, image: Image.Image):
+        self._images[key] = image
+        self._bytes += self._size(image)
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            self._spill_oldest()
+
+    def _spill_oldest(self):
+        key, image = self._images.popitem(last=False)
+        self._bytes -= self._size(image)
+        if self._spill_dir is None:
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="pdf-crops-"))
+        path = self._spill_dir / f"{key}.npy"
+        np.save(path, np.asarray(image))
+        self._spilled[key] = path
+
+    def get(self, key: str) -> Image.Image:
+        """Return a stored image, loading it back if it was spilled."""
+        if key in self._images:
+            self._images.move_to_end(key)
+            return self._images[key]
+        path = self._spilled.pop(key)
+        image = Image.fromarray(np.load(path))
+        path.unlink(missing_ok=True)
+        self._store(key, image)
+        return image
+
+    def replace(self, key: str, image: Image.Image):
+        """Swap the image stored under key (e.g. after appending a caption)."""
+        self.discard(key)
+        self._store(key, image)
+
+    def pop(self, key: str) -> Image.Image:
+        image = self.get(key)
+        self.discard(key)
+        return image
+
+    def discard(self, key: str):
+        image = self._images.pop(key, None)
+        if image is not None:
+            self._bytes -= self._size(image)
+        path = self._spilled.pop(key, None)
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    def adopt(self, elements: List[Dict]):
+        """Move "_image" crops from save_layout_elements output into the store."""
+        for elem in elements:
+            image = elem.pop("_image", None)
+            if image is not None:
+                elem["_crop"] = self.put(image)
+
+    def close(self):
+        self._images.clear()
+        self._spilled.clear()
+        self._bytes = 0
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+
+def _crop_image(elem: Dict, crops: CropStore) -> Optional[Image.Image]:
+    """Pending crop of an element as RGB."""
+    key = elem.get("_crop")
+    if key is None:
+        logger.warning(f"Missing crop for stitching: {elem.get('image_path')}")
         return None
-    img = Image.open(image_path)
+    img = crops.get(key)
     if img.mode != "RGB":
         img = img.convert("RGB")
     return img
 
 
+def write_element_images(elements: List[Dict], out_dir: Path, crops: CropStore):
+    """
+    Encode every pending crop to its image_path, plus its thumbnails from the same
+    in-memory image. This is the only PNG encode per image.
+    """
+    for elem in elements:
+        key = elem.pop("_crop", None)
+        if key is None:
+            continue
+        write_element_image(crops.pop(key), out_dir, elem["image_path"])
+
+
+def write_element_image(img: Image.Image, out_dir: Path, image_path: str):
+    """Encode one element image to image_path, plus its thumbnails."""
+    path = out_dir / image_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    img.save(path)
+    write_thumbnails(img, out_dir, image_path)
+
+
+def write_settled_element_images(
+    elements: List[Dict],
+    dets_by_page: Dict[int, PageDetections],
+    page_count: int,
+    out_dir: Path,
+):
+    """
+    Encode the "_image" crops of a page batch that document-wide stitching cannot
+    change (see _may_be_stitched), so pool workers only send the others back as images.
+    """
+    for elem, keep in zip(elements, _may_be_stitched(elements, dets_by_page, page_count)):
+        if not keep and "_image" in elem:
+            write_element_image(elem.pop("_image"), out_dir, elem["image_path"])
+
+
+def _may_be_stitched(
+    elements: List[Dict],
+    dets_by_page: Dict[int, PageDetections],
+    page_count: int,
+) -> List[bool]:
+    """
+    For each element of a page batch (dets_by_page: 0-based page -> detections), whether
+    merge_spanning_tables or attach_cross_page_figure_captions may change its image
+    with the default settings: tables continued on a neighbouring page, and figures
+    with a caption or title near the top of the next page. Pages outside the batch are
+    unknown, so elements next to them count as well.
+    """
+    def known(index: int) -> bool:
+        return not 0 <= index < page_count or index in dets_by_page
+
+    keep = {}
+    tables_by_page: Dict[int, List[Dict]] = {}
+    for elem in elements:
+        page = elem.get("page")
+        if elem.get("type") == "table" and isinstance(page, int):
+            tables_by_page.setdefault(page, []).append(elem)
+    for page, tables in tables_by_page.items():
+        edge = not known(page - 2) or not known(page)
+        for table in tables:
+            keep[id(table)] = keep.get(id(table), False) or edge
+        if page + 1 in tables_by_page:
+            links = _table_continuation_matrix(
+                tables, tables_by_page[page + 1], TABLE_STITCH_TOLERANCES
+            ) > 0
+            for table, linked in zip(tables, links.any(axis=1)):
+                keep[id(table)] |= bool(linked)
+            for table, linked in zip(tables_by_page[page + 1], links.any(axis=0)):
+                keep[id(table)] = keep.get(id(table), False) or bool(linked)
+
+    max_top = CROSS_PAGE_CAPTION_THRESHOLDS["max_top_pixels"]
+    for elem in elements:
+        page = elem.get("page")
+        if elem.get("type") != "figure" or not isinstance(page, int) or page >= page_count:
+            continue
+        next_dets = dets_by_page.get(page)
+        if next_dets is None:
+            keep[id(elem)] = True
+            continue
+        names = next_dets.name_array()
+        near_top = next_dets.records["bbox"][:, 1] <= max_top
+        keep[id(elem)] = bool(np.any(near_top & np.isin(names, ("figure_caption", "title"))))
+
+    return [keep.get(id(elem), False) for elem in elements]
+
+
+def thumbnail_path(image_path: str, size: str) -> str:
+    """Path of an element image's thumbnail, relative to the document folder."""
+    return str(Path(THUMBNAILS_DIRNAME) / size / Path(image_path).with_suffix(".webp"))
+
+
+def write_thumbnails(
+    img: Image.Image, out_dir: Path, image_path: str, sizes: Optional[Iterable[str]] = None
+):
+    """Write WebP thumbnails of an element image; each size is reduced from the previous one."""
+    sizes = set(THUMBNAIL_SIZES if sizes is None else sizes)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGB")
+    for size, longest in THUMBNAIL_SIZES.items():
+        factor = longest / max(img.width, img.height)
+        if factor < 1:
+            img = img.resize(
+                (max(1, round(img.width * factor)), max(1, round(img.height * factor))),
+                Image.LANCZOS,
+                reducing_gap=3.0,
+            )
+        if size not in sizes:
+            continue
+        path = out_dir / thumbnail_path(image_path, size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+        img.save(tmp_path, "WEBP", quality=THUMBNAIL_QUALITY)
+        os.replace(tmp_path, path)
+
+
+def ensure_thumbnail(out_dir: Path, image_path: str, size: str) -> Optional[Path]:
+    """
+    Thumbnail of an element image, (re)built from the PNG when it is missing or older
+    than it, e.g. for documents processed before thumbnails existed or with lazy_crops.
+    None if there is no such image.
+    """
+    if size not in THUMBNAIL_SIZES:
+        return None
+    path = out_dir / thumbnail_path(image_path, size)
+    source = out_dir / image_path
+    if not source.exists() and materialize_element_image(out_dir, image_path) is None:
+        return path if path.exists() else None
+    if path.exists() and path.stat().st_mtime >= source.stat().st_mtime:
+        return path
+    with Image.open(source) as img:
+        write_thumbnails(img, out_dir, image_path, sizes=[size])
+    return path
+
+
+def remove_element_images(out_dir: Path):
+    """Delete a document's figure/table images with their thumbnails and other-DPI renders."""
+    for sub in ("figures", "tables"):
+        for old_crop in (out_dir / sub).glob("*.png"):
+            old_crop.unlink()
+    for sub in (THUMBNAILS_DIRNAME, RENDERS_DIRNAME):
+        shutil.rmtree(out_dir / sub, ignore_errors=True)
+
+
+def source_pdf(out_dir: Path) -> Optional[Path]:
+    """The PDF a document folder was extracted from: a copy inside it, or the catalog's path."""
+    candidate = out_dir / f"{out_dir.name}.pdf"
+    if candidate.exists():
+        return candidate
+    catalog = get_output_catalog(out_dir.parent)
+    doc = catalog.get(out_dir.name) if catalog is not None else None
+    if doc and doc.get("pdf_path") and Path(doc["pdf_path"]).exists():
+        return Path(doc["pdf_path"])
+    return None
+
+
+def _find_element(out_dir: Path, image_path: str) -> Optional[Dict]:
+    for content_list_path in out_dir.glob("*_content_list.json"):
+        elem = _element_index(content_list_path).get(image_path)
+        if elem is not None:
+            return elem
+    return None
+
+
+def _element_index(content_list_path: Path) -> Dict[str, Dict]:
+    """
+    image_path -> element of a content list. Each version of the file (by mtime) is
+    parsed once, so a gallery of lazy crops doesn't re-read it for every image.
+    """
+    path = str(content_list_path)
+    key = (path, content_list_path.stat().st_mtime_ns)
+    with _element_indexes_lock:
+        index = _element_indexes.get(key)
+        if index is not None:
+            _element_indexes.move_to_end(key)
+            return index
+
+    elements = json.loads(content_list_path.read_text(encoding="utf-8"))
+    index = {elem["image_path"]: elem for elem in elements if elem.get("image_path")}
+    with _element_indexes_lock:
+        for stale in [k for k in _element_indexes if k[0] == path]:
+            del _element_indexes[stale]
+        _element_indexes[key] = index
+        while len(_element_indexes) > ELEMENT_INDEX_CACHE_SIZE:
+            _element_indexes.popitem(last=False)
+    return index
+
+
+def compose_region_images(
+    images: Sequence[Image.Image], regions: Sequence[Dict], stitch: str = "vertical"
+) -> Image.Image:
+    """Put rendered regions together the way stitching composed the element's crop."""
+    if stitch == "horizontal":
+        return _concat_images(images, "horizontal")
+    composed = images[0]
+    for image, region in zip(images[1:], regions[1:]):
+        composed = _append_segment_image(
+            composed, image, resize_to_base=region.get("fit_width", False)
+        )
+    return composed
+
+
+def materialize_element_image(
+    out_dir: Path, image_path: str, dpi: Optional[int] = None
+) -> Optional[Path]:
+    """
+    File of an element image, rendered from the element's regions in the source PDF
+    if it doesn't exist yet: at CROP_SCALE to image_path itself, or at `dpi` (clamped
+    to CROP_DPI_RANGE) under RENDERS_DIRNAME. None if the document has no such
+    element or its PDF is gone.
+    """
+    if dpi is None:
+        path = out_dir / image_path
+        crop_scale = CROP_SCALE
+    else:
+        dpi = min(max(int(dpi), CROP_DPI_RANGE[0]), CROP_DPI_RANGE[1])
+        path = out_dir / RENDERS_DIRNAME / str(dpi) / image_path
+        crop_scale = dpi / 72
+    if path.exists():
+        return path
+
+    elem = _find_element(out_dir, image_path)
+    pdf_path = source_pdf(out_dir)
+    if elem is None or not elem.get("regions") or pdf_path is None:
+        return None
+
+    images = []
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        for region in elem["regions"]:
+            with _PDFIUM_LOCK:
+                page = pdf[region["page"] - 1]
+            try:
+                # Regions are in points, so the layout scale is 1
+                image = render_region(page, region["bbox_points"], 1.0, crop_scale)
+            finally:
+                with _PDFIUM_LOCK:
+                    page.close()
+            if image is None:
+                return None
+            images.append(image)
+    finally:
+        with _PDFIUM_LOCK:
+            pdf.close()
+
+    image = compose_region_images(images, elem["regions"], elem.get("stitch", "vertical"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+    image.save(tmp_path, "PNG")
+    os.replace(tmp_path, path)
+    return path
+
+
 def _pad_width(img: Image.Image, target_width: int) -> Image.Image:
     if img.width >= target_width:
         return img
@@ -423,14 +1591,6 @@ def _pad_width(img: Image.Image, target_width: int) -> Image.Image:
     return canvas
 
 
-def _pad_height(img: Image.Image, target_height: int) -> Image.Image:
-    if img.height >= target_height:
-        return img
-    canvas = Image.new("RGB", (img.width, target_height), color=(255, 255, 255))
-    canvas.paste(img, (0, 0))
-    return canvas
-
-
 def _append_segment_image(
     base_img: Image.Image,
     segment_img: Image.Image,
@@ -465,55 +1625,12 @@ def _append_segment_image(
     return stitched
 
 
-def _render_pdf_page(
-    pdf_doc: pdfium.PdfDocument,
-    page_index: int,
-    scale: float,
-    cache: Dict[int, Image.Image],
-) -> Optional[Image.Image]:
-    """Render a PDF page to a PIL image with caching."""
-    if page_index in cache:
-        return cache[page_index]
-
-    try:
-        page = pdf_doc[page_index]
-        bitmap = page.render(scale=scale)
-        pil_img = bitmap.to_pil()
-        page.close()
-    except Exception as exc:
-        logger.error(f"Failed to render page {page_index + 1} for caption stitching: {exc}")
-        return None
-
-    cache[page_index] = pil_img
-    return pil_img
-
-
-def _crop_pdf_region(
-    page_img: Optional[Image.Image], bbox: List[float]
-) -> Optional[Image.Image]:
-    """Crop a region from a rendered PDF page."""
-    if page_img is None:
-        return None
-
-    x0, y0, x1, y1 = map(int, bbox)
-    x0 = max(0, x0)
-    y0 = max(0, y0)
-    x1 = min(page_img.width, max(x0 + 1, x1))
-    y1 = min(page_img.height, max(y0 + 1, y1))
-
-    if x0 >= x1 or y0 >= y1:
-        return None
-
-    crop = page_img.crop((x0, y0, x1, y1))
-    if crop.mode == "CMYK":
-        crop = crop.convert("RGB")
-    return crop
-
-
-def write_markdown_document(pdf_path: Path, out_dir: Path) -> Optional[Path]:
+def write_markdown_document(session: DocumentSession, out_dir: Path) -> Optional[Path]:
     """
     Extract markdown text from a PDF using PyMuPDF4LLM and write it to disk.
+    Reuses the session's PyMuPDF document instead of opening the file again.
     """
+    pdf_path = session.path
     if pymupdf4llm is None:
         logger.warning(
             "Skipping markdown extraction for %s because pymupdf4llm is not installed.",
@@ -522,11 +1639,17 @@ def write_markdown_document(pdf_path: Path, out_dir: Path) -> Optional[Path]:
         return None
 
     try:
-        markdown_content = pymupdf4llm.to_markdown(str(pdf_path))
+        with _FITZ_LOCK:
+            markdown_content = pymupdf4llm.to_markdown(session.fitz)
     except Exception as exc:
         logger.error(f"  Failed to create markdown for {pdf_path.name}: {exc}")
         return None
 
+    return save_markdown(markdown_content, pdf_path, out_dir)
+
+
+def save_markdown(markdown_content: Any, pdf_path: Path, out_dir: Path) -> Optional[Path]:
+    """Normalize pymupdf4llm output and write it to <out_dir>/<stem>.md."""
     if isinstance(markdown_content, list):
         markdown_content = "\n\n".join(
             part for part in markdown_content if isinstance(part, str)
@@ -552,71 +1675,479 @@ def write_markdown_document(pdf_path: Path, out_dir: Path) -> Optional[Path]:
     return md_path
 
 
-def _collect_text_under_title_cross_page(
-    title_det: Dict,
-    sorted_dets: List[Dict],
-    start_idx: int,
-    page_idx: int,
-    used_indices: Set[Tuple[int, int]],
-    settings: Optional[Dict[str, float]] = None,
-) -> List[Dict]:
-    """Collect text elements directly below a title on the next page."""
-    if settings is None:
-        settings = TITLE_TEXT_ASSOCIATION
-    texts: List[Dict] = []
-    title_box = title_det["bbox"]
-    last_bottom = title_box[3]
+def _markdown_document(pdf_path: Path, doc_key: Tuple[str, int, int]) -> "fitz.Document":
+    """Open PyMuPDF document of a markdown worker, reused across its page chunks."""
+    doc = _markdown_docs.get(doc_key)
+    if doc is not None:
+        _markdown_docs.move_to_end(doc_key)
+        return doc
+
+    doc = fitz.open(str(pdf_path))
+    _markdown_docs[doc_key] = doc
+    while len(_markdown_docs) > max(1, WORKER_DOC_CACHE_SIZE):
+        _, old_doc = _markdown_docs.popitem(last=False)
+        old_doc.close()
+    return doc
+
+
+def _markdown_pages_job(
+    pdf_path: Path, doc_key: Tuple[str, int, int], page_numbers: List[int]
+) -> List[Tuple[int, str]]:
+    """Markdown of a run of pages as (page number, text), run by a markdown worker."""
+    doc = _markdown_document(pdf_path, doc_key)
+    chunks = pymupdf4llm.to_markdown(doc, pages=page_numbers, page_chunks=True)
+    texts = [chunk.get("text", "") if isinstance(chunk, dict) else str(chunk) for chunk in chunks]
+    if len(texts) != len(page_numbers):
+        raise RuntimeError(
+            f"expected markdown for {len(page_numbers)} pages, got {len(texts)}"
+        )
+    return list(zip(page_numbers, texts))
 
-    for follower in sorted_dets[start_idx + 1 :]:
-        det_index = follower.get("index")
-        if det_index is None or (page_idx, det_index) in used_indices:
-            continue
 
-        if follower["name"] == "title":
-            break
+def markdown_pages_dir(out_dir: Path) -> Path:
+    """Directory holding the per-page markdown chunks of a document in progress."""
+    return out_dir / MARKDOWN_PAGES_DIRNAME
 
-        if follower["name"] != "text":
-            continue
 
-        text_box = follower["bbox"]
-        if text_box[1] < title_box[1]:
+def read_markdown_pages(out_dir: Path, since: int = 0) -> List[Tuple[int, str]]:
+    """
+    Markdown chunks already streamed for a document in progress, as (page number,
+    text) in page order, skipping pages before `since`. Empty once <stem>.md exists.
+    """
+    pages_dir = markdown_pages_dir(out_dir)
+    pages = []
+    if not pages_dir.is_dir():
+        return pages
+    for chunk_path in sorted(pages_dir.glob("page_*.md")):
+        try:
+            pno = int(chunk_path.stem.split("_", 1)[1])
+            if pno >= since:
+                pages.append((pno, chunk_path.read_text(encoding="utf-8")))
+        except (ValueError, OSError):
+            continue  # Partially written or removed during assembly
+    return pages
+
+
+class MarkdownJob:
+    """
+    Page-chunked markdown extraction of one PDF on the markdown process pool.
+    Runs of MARKDOWN_CHUNK_PAGES pages are extracted in parallel; each finished
+    page is written to markdown_pages/page_<n>.md (and passed to `on_page`) as soon
+    as its chunk completes, and wait() assembles <stem>.md in page order.
+    """
+
+    def __init__(
+        self,
+        executor: ProcessPoolExecutor,
+        session: DocumentSession,
+        out_dir: Path,
+        on_page: Optional[Any] = None,
+    ):
+        self.pdf_path = session.path
+        self.out_dir = out_dir
+        self.page_count = session.page_count
+        self.on_page = on_page
+        self._texts: Dict[int, str] = {}
+        self._streamed = threading.Condition()
+        self._chunks_streamed = 0
+        self._pages_dir = markdown_pages_dir(out_dir)
+        self._pages_dir.mkdir(parents=True, exist_ok=True)
+        chunk_size = max(1, MARKDOWN_CHUNK_PAGES)
+        self._futures: List[Future] = []
+        for start in range(0, self.page_count, chunk_size):
+            page_numbers = list(range(start, min(start + chunk_size, self.page_count)))
+            future = executor.submit(
+                _markdown_pages_job, self.pdf_path, session.key, page_numbers
+            )
+            future.add_done_callback(self._chunk_done)
+            self._futures.append(future)
+
+    def _chunk_done(self, future: Future):
+        # Runs on the executor's management thread as each chunk finishes
+        try:
+            if not future.cancelled() and future.exception() is None:
+                self._stream_pages(future.result())
+        finally:
+            with self._streamed:
+                self._chunks_streamed += 1
+                self._streamed.notify_all()
+
+    def _stream_pages(self, pages: List[Tuple[int, str]]):
+        for pno, text in pages:
+            chunk_path = self._pages_dir / f"page_{pno:04d}.md"
+            try:
+                tmp_path = chunk_path.with_suffix(".tmp")
+                tmp_path.write_text(text, encoding="utf-8")
+                os.replace(tmp_path, chunk_path)
+            except OSError as exc:
+                logger.debug(f"Could not stream markdown page {pno + 1}: {exc}")
+            self._texts[pno] = text
+            if self.on_page is not None:
+                try:
+                    self.on_page(pno, text)
+                except Exception as exc:
+                    logger.debug(f"Markdown page callback failed: {exc}")
+
+    def cancel(self):
+        for future in self._futures:
+            future.cancel()
+        shutil.rmtree(self._pages_dir, ignore_errors=True)
+
+    def wait(self) -> Optional[Path]:
+        """
+        Block until every chunk is done and write <stem>.md. Raises the first chunk
+        failure; the streamed pages are removed either way.
+        """
+        try:
+            for future in self._futures:
+                future.result()
+            # Results are set before their callbacks run; wait for the last page to stream
+            with self._streamed:
+                self._streamed.wait_for(
+                    lambda: self._chunks_streamed == len(self._futures)
+                )
+            content = "".join(self._texts[pno] for pno in range(self.page_count))
+            return save_markdown(content, self.pdf_path, self.out_dir)
+        finally:
+            shutil.rmtree(self._pages_dir, ignore_errors=True)
+
+
+def shutdown_markdown_executor():
+    global _markdown_executor
+    if _markdown_executor is not None:
+        _markdown_executor.shutdown(wait=True, cancel_futures=True)
+        _markdown_executor = None
+
+
+def submit_markdown(
+    session: DocumentSession, out_dir: Path, on_page: Optional[Any] = None
+) -> Optional[MarkdownJob]:
+    """
+    Start page-chunked markdown extraction on the markdown process pool and return
+    the job, or None when parallel markdown is off or the pool cannot be started.
+    The pool is spawned once and reused for every later document.
+    """
+    global _markdown_executor
+    if not PARALLEL_MARKDOWN or pymupdf4llm is None or not session.page_count:
+        return None
+    try:
+        with _markdown_executor_lock:
+            if _markdown_executor is None:
+                workers = MARKDOWN_WORKERS or max(1, cpu_count() // 2)
+                _markdown_executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                atexit.register(shutdown_markdown_executor)
+            executor = _markdown_executor
+        return MarkdownJob(executor, session, out_dir, on_page)
+    except Exception as exc:
+        logger.warning(f"Could not start markdown processes ({exc}); extracting in-process")
+        shutdown_markdown_executor()
+        return None
+
+
+def join_markdown(
+    job: MarkdownJob, session: DocumentSession, out_dir: Path
+) -> Optional[Path]:
+    """Wait for a submit_markdown job, redoing it in-process if any chunk failed."""
+    try:
+        return job.wait()
+    except Exception as exc:
+        logger.warning(
+            f"  Markdown processes failed for {session.name} ({exc}); extracting in-process"
+        )
+        if _markdown_executor is not None and getattr(_markdown_executor, "_broken", False):
+            shutdown_markdown_executor()
+        return write_markdown_document(session, out_dir)
+
+
+# ----------------------------------------------------------------------
+# Markdown from our own detections
+# ----------------------------------------------------------------------
+MARKDOWN_SKIPPED_CLASSES = frozenset({"abandon", "header", "footer"})
+MARKDOWN_CAPTION_CLASSES = frozenset(
+    {"figure_caption", "table_caption", "table_footnote", "formula_caption"}
+)
+_LIST_MARKER = re.compile(
+    r"^(?:[\u2022\u25e6\u25aa\u2023\u25cf\u25cb\u25a0\u2013\u2014*-]"  # Bullets and dashes
+    r"|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s+"  # 1.  2)  (a)  b.
+)
+
+
+def _page_text_lines(page: "fitz.Page", scale: float):
+    """
+    Text lines of a page from the PDF text layer: boxes in layout pixels, texts,
+    font sizes and the PyMuPDF block each line belongs to.
+    """
+    boxes, texts, sizes, blocks = [], [], [], []
+    for bno, block in enumerate(page.get_text("dict", sort=True)["blocks"]):
+        if block.get("type") != 0:
             continue
+        for line in block["lines"]:
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if not text:
+                continue
+            boxes.append(line["bbox"])
+            texts.append(text)
+            sizes.append(max(span["size"] for span in line["spans"]))
+            blocks.append(bno)
+    line_boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale
+    return line_boxes, texts, sizes, np.asarray(blocks, dtype=np.int64)
+
+
+def _line_owners(line_boxes: np.ndarray, det_boxes: np.ndarray) -> np.ndarray:
+    """Index of the smallest detection containing each line's center, or -1."""
+    if not len(line_boxes) or not len(det_boxes):
+        return np.full(len(line_boxes), -1, dtype=np.int64)
+    cx = ((line_boxes[:, 0] + line_boxes[:, 2]) / 2)[:, None]
+    cy = ((line_boxes[:, 1] + line_boxes[:, 3]) / 2)[:, None]
+    inside = (
+        (cx >= det_boxes[:, 0]) & (cx <= det_boxes[:, 2])
+        & (cy >= det_boxes[:, 1]) & (cy <= det_boxes[:, 3])
+    )
+    areas = (det_boxes[:, 2] - det_boxes[:, 0]) * (det_boxes[:, 3] - det_boxes[:, 1])
+    owners = np.where(inside, areas[None, :], np.inf).argmin(axis=1)
+    owners[~inside.any(axis=1)] = -1
+    return owners
 
-        gap = text_box[1] - last_bottom
-        if gap > settings["max_text_gap"]:
-            break
 
-        if _horizontal_overlap_ratio(title_box, text_box) < settings["min_overlap"]:
+def _reading_order(boxes: np.ndarray, page_width: float) -> List[int]:
+    """
+    Order regions top to bottom; between blocks that cross the page center, the
+    left column is read before the right one.
+    """
+    mid = page_width / 2
+    margin = page_width * 0.02
+    crosses_mid = (boxes[:, 0] < mid - margin) & (boxes[:, 2] > mid + margin)
+    centers = (boxes[:, 0] + boxes[:, 2]) / 2
+    order: List[int] = []
+    band: List[int] = []
+
+    def flush():
+        order.extend(i for i in band if centers[i] < mid)
+        order.extend(i for i in band if centers[i] >= mid)
+        band.clear()
+
+    for i in np.argsort(boxes[:, 1], kind="stable").tolist():
+        if crosses_mid[i]:
+            flush()
+            order.append(i)
+        else:
+            band.append(i)
+    flush()
+    return order
+
+
+def _join_lines(lines: Sequence[str]) -> str:
+    """Reflow text lines into one paragraph, undoing end-of-line hyphenation."""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        elif text:
+            text += " " + line
+        else:
+            text = line
+    return text
+
+
+def _list_markdown(lines: Sequence[str]) -> str:
+    items: List[List[str]] = []
+    for line in lines:
+        if _LIST_MARKER.match(line) or not items:
+            items.append([_LIST_MARKER.sub("", line, count=1)])
+        else:
+            items[-1].append(line)
+    return "\n".join(f"- {_join_lines(item)}" for item in items)
+
+
+def _table_markdown(page: "fitz.Page", bbox: Sequence[float], scale: float) -> str:
+    """Text of a table region as a markdown table, or "" when PyMuPDF finds none."""
+    clip = fitz.Rect(*(v / scale for v in bbox))
+    try:
+        try:
+            # Our detection already located the table; skip pymupdf-layout's own model
+            found = page.find_tables(clip=clip, use_layout=False)
+        except TypeError:  # PyMuPDF without layout support
+            found = page.find_tables(clip=clip)
+        return "\n\n".join(table.to_markdown().strip() for table in found.tables)
+    except Exception as exc:
+        logger.debug(f"Table text extraction failed on page {page.number + 1}: {exc}")
+        return ""
+
+
+def _element_anchors(
+    elements: List[Dict], page_num: int, det_boxes: np.ndarray, det_names: np.ndarray
+) -> Dict[int, Dict]:
+    """Map each figure/table element of a page to the detection it was cropped from."""
+    anchors: Dict[int, Dict] = {}
+    cx = (det_boxes[:, 0] + det_boxes[:, 2]) / 2
+    cy = (det_boxes[:, 1] + det_boxes[:, 3]) / 2
+    for elem in elements:
+        if elem.get("page") != page_num + 1:
             continue
+        x0, y0, x1, y1 = elem["bbox_pixels"]
+        candidates = np.flatnonzero(
+            (det_names == elem["type"]) & (cx >= x0) & (cx <= x1) & (cy >= y0) & (cy <= y1)
+        )
+        for i in candidates[np.argsort(det_boxes[candidates, 1], kind="stable")].tolist():
+            if i not in anchors:
+                anchors[i] = elem
+                break
+    return anchors
+
+
+def build_markdown_from_detections(
+    session: DocumentSession,
+    all_dets: List[Optional[PageDetections]],
+    elements: List[Dict],
+    scale: float,
+) -> str:
+    """
+    Markdown for a document from the layout the image pipeline already detected and
+    the PDF text layer, so no second layout model runs. Titles become headings
+    (levels by font size), lists become bullet lists, figures and tables link to
+    their written crops with the captions stitched to them, and tables also get
+    their text as a markdown table. Lines outside every detection are kept as
+    paragraphs; headers, footers and abandoned regions are dropped.
+    """
+    doc = session.fitz
+    # Captions already stitched to an element are written next to its link
+    caption_owner: Dict[Tuple[int, int], Dict] = {}
+    for elem in elements:
+        for cap in elem.get("captions", []):
+            caption_owner[(cap["page"] - 1, cap["index"])] = elem
+    caption_lines: Dict[int, List[str]] = {}
+
+    pages: List[List[Tuple[str, Any, List[str], float]]] = []
+    title_sizes: Set[float] = set()
+    for pno in range(session.page_count):
+        dets = all_dets[pno] if pno < len(all_dets) else None
+        page = doc[pno]
+        line_boxes, texts, sizes, blocks = _page_text_lines(page, scale)
+        if dets is not None and len(dets):
+            det_boxes = dets.records["bbox"]
+            det_names = dets.name_array()
+        else:
+            det_boxes = np.empty((0, 4), dtype=np.float32)
+            det_names = np.empty(0, dtype=object)
+        owners = _line_owners(line_boxes, det_boxes)
+        anchors = _element_anchors(elements, pno, det_boxes, det_names)
+
+        regions: List[Tuple[str, Any, List[str], float]] = []
+        region_boxes: List[Sequence[float]] = []
+        for i, name in enumerate(det_names.tolist()):
+            owned = np.flatnonzero(owners == i)
+            lines = [texts[j] for j in owned]
+            size = max((sizes[j] for j in owned), default=0.0)
+            if name in MARKDOWN_SKIPPED_CLASSES:
+                continue
+            if (pno, i) in caption_owner:
+                caption_lines.setdefault(id(caption_owner[(pno, i)]), []).extend(lines)
+                continue
+            if name in ("figure", "table"):
+                regions.append((name, (anchors.get(i), det_boxes[i]), lines, size))
+            elif lines:
+                regions.append((name, None, lines, size))
+                if name == "title":
+                    title_sizes.add(round(size * 2) / 2)
+            else:
+                continue
+            region_boxes.append(det_boxes[i])
+
+        # Text the model did not cover keeps the text layer's own blocks
+        for bno in np.unique(blocks[owners == -1]).tolist():
+            members = np.flatnonzero((owners == -1) & (blocks == bno))
+            regions.append(("text", None, [texts[j] for j in members], 0.0))
+            region_boxes.append([
+                line_boxes[members, 0].min(), line_boxes[members, 1].min(),
+                line_boxes[members, 2].max(), line_boxes[members, 3].max(),
+            ])
+
+        if regions:
+            page_width = session.page_size(pno)[0] * scale
+            order = _reading_order(np.asarray(region_boxes, dtype=np.float32), page_width)
+            regions = [regions[i] for i in order]
+        pages.append(regions)
+
+    heading_levels = {
+        size: min(level, 3) for level, size in enumerate(sorted(title_sizes, reverse=True), 1)
+    }
+    parts: List[str] = []
+    for pno, regions in enumerate(pages):
+        for name, ref, lines, size in regions:
+            if name == "title":
+                level = heading_levels.get(round(size * 2) / 2, 1)
+                parts.append(f"{'#' * level} {_join_lines(lines)}")
+            elif name == "list":
+                parts.append(_list_markdown(lines))
+            elif name in MARKDOWN_CAPTION_CLASSES:
+                parts.append(f"*{_join_lines(lines)}*")
+            elif name in ("figure", "table"):
+                elem, bbox = ref
+                if elem is not None:
+                    label = "Figure" if name == "figure" else "Table"
+                    parts.append(f"![{label}]({elem['image_path']})")
+                    captions = caption_lines.get(id(elem))
+                    if captions:
+                        parts.append(f"*{_join_lines(captions)}*")
+                if name == "table":
+                    # Without a recognizable grid the table text is kept as a paragraph
+                    parts.append(_table_markdown(doc[pno], bbox, scale) or _join_lines(lines))
+            else:
+                parts.append(_join_lines(lines))
+    return "\n\n".join(part for part in parts if part.strip())
+
+
+def write_markdown_from_detections(
+    session: DocumentSession,
+    out_dir: Path,
+    all_dets: List[Optional[PageDetections]],
+    elements: List[Dict],
+    scale: float,
+) -> Optional[Path]:
+    """Write <stem>.md built by build_markdown_from_detections, falling back to pymupdf4llm."""
+    try:
+        with _FITZ_LOCK:
+            markdown_content = build_markdown_from_detections(session, all_dets, elements, scale)
+    except Exception as exc:
+        logger.warning(
+            f"  Markdown from detections failed for {session.name} ({exc}); using pymupdf4llm"
+        )
+        return write_markdown_document(session, out_dir)
+    return save_markdown(markdown_content, session.path, out_dir)
 
-        texts.append(follower)
-        last_bottom = text_box[3]
 
-    return texts
+def markdown_from_detections(extract_images: bool) -> bool:
+    """Whether markdown is built from our detections rather than by pymupdf4llm."""
+    return MARKDOWN_FROM_DETECTIONS and extract_images
 
 
 def attach_cross_page_figure_captions(
     elements: List[Dict],
-    all_dets: Sequence[Optional[List[Dict[str, Any]]]],
-    pdf_bytes: bytes,
-    out_dir: Path,
+    all_dets: Sequence[Optional[PageDetections]],
+    session: DocumentSession,
+    crops: CropStore,
     scale: float,
+    thresholds: Optional[Dict[str, float]] = None,
+    title_text_settings: Optional[Dict[str, float]] = None,
 ) -> List[Dict]:
     """
     If a figure caption appears on the next page, stitch it to the prior figure.
+    Works on the pending crops in `crops`; nothing is read from or written to disk.
+    Figures without a pending crop (lazy_crops) only get the caption's region.
     """
+    if thresholds is None:
+        thresholds = CROSS_PAGE_CAPTION_THRESHOLDS
+    if title_text_settings is None:
+        title_text_settings = TITLE_TEXT_ASSOCIATION
+
     figures = [elem for elem in elements if elem.get("type") == "figure"]
     if not figures or not all_dets:
         return elements
 
-    try:
-        pdf_doc = pdfium.PdfDocument(pdf_bytes)
-    except Exception as exc:
-        logger.error(f"Unable to reopen PDF for figure caption stitching: {exc}")
-        return elements
-
-    page_cache: Dict[int, Image.Image] = {}
-    used_following_ids: Set[Tuple[int, int]] = set()
+    layout: Optional[PageLayout] = None
+    used_following_ids: Dict[int, Set[int]] = {}
 
     # Mark existing caption/title/text detections as used
     for elem in figures:
@@ -626,7 +2157,7 @@ def attach_cross_page_figure_captions(
                 page_no = seg.get("page")
                 if idx is None or page_no is None:
                     continue
-                used_following_ids.add((page_no - 1, idx))
+                used_following_ids.setdefault(page_no - 1, set()).add(idx)
 
     for elem in figures:
         page_no = elem.get("page")
@@ -644,100 +2175,89 @@ def attach_cross_page_figure_captions(
             continue
 
         fig_width = bbox[2] - bbox[0]
-        page_img = _render_pdf_page(pdf_doc, next_idx, scale, page_cache)
-        if page_img is None:
+        try:
+            next_page_size = session.page_size(next_idx)
+            next_page_height = next_page_size[1] * scale
+        except Exception as exc:
+            logger.error(f"Failed to load page {next_idx + 1} for caption stitching: {exc}")
             continue
-
-        next_page_height = page_img.height
         max_top_allowed = min(
-            CROSS_PAGE_CAPTION_THRESHOLDS["max_top_pixels"],
-            int(next_page_height * CROSS_PAGE_CAPTION_THRESHOLDS["max_top_ratio"]),
+            thresholds["max_top_pixels"],
+            int(next_page_height * thresholds["max_top_ratio"]),
         )
 
-        sorted_next = sorted(
-            [det for det in next_dets if det.get("bbox")],
-            key=lambda det: det["bbox"][1],
-        )
+        # Figures come in page order, so only the latest next-page layout is kept
+        if layout is None or layout.page_dets is not next_dets:
+            layout = PageLayout(next_dets)
+        available = layout.available(used_following_ids.get(next_idx, set()))
+        near_top = available & (layout.tops <= max_top_allowed)
+        overlaps = layout.overlap_with(bbox)
+        x_diffs = np.abs(bbox[0] - layout.boxes[:, 0])
 
         caption_candidate: Optional[Tuple[Dict, int]] = None
-        caption_candidates = []
-        for det in sorted_next:
-            if det.get("name") != "figure_caption":
-                continue
-            det_index = det.get("index")
-            if det_index is None or (next_idx, det_index) in used_following_ids:
-                continue
-
-            det_bbox = det.get("bbox")
-            if not det_bbox or det_bbox[1] > max_top_allowed:
-                continue
-
-            overlap = _horizontal_overlap_ratio(bbox, det_bbox)
-            x_diff = abs(bbox[0] - det_bbox[0])
-            width_diff = abs((bbox[2] - bbox[0]) - (det_bbox[2] - det_bbox[0]))
-
-            if overlap < CROSS_PAGE_CAPTION_THRESHOLDS["min_overlap"]:
-                if (
-                    x_diff > CROSS_PAGE_CAPTION_THRESHOLDS["x_tol"]
-                    or width_diff > CROSS_PAGE_CAPTION_THRESHOLDS["width_tol"]
-                ):
-                    continue
-
-            score = width_diff + 0.5 * x_diff
-            caption_candidates.append((score, det, det_index))
-
-        if caption_candidates:
-            caption_candidates.sort(key=lambda item: item[0])
-            _, best_det, best_index = caption_candidates[0]
-            caption_candidate = (best_det, best_index)
+        width_diffs = np.abs(fig_width - (layout.boxes[:, 2] - layout.boxes[:, 0]))
+        caption_rows = np.flatnonzero(
+            near_top
+            & (layout.names == "figure_caption")
+            & (
+                (overlaps >= thresholds["min_overlap"])
+                | (
+                    (x_diffs <= thresholds["x_tol"])
+                    & (width_diffs <= thresholds["width_tol"])
+                )
+            )
+        )
+        if caption_rows.size:
+            scores = width_diffs[caption_rows] + 0.5 * x_diffs[caption_rows]
+            best_row = int(caption_rows[np.argmin(scores)])
+            caption_candidate = (layout.det(best_row), int(layout.indices[best_row]))
 
         title_candidate: Optional[Tuple[Dict, int]] = None
         title_texts: List[Dict] = []
-        for idx_sorted, det in enumerate(sorted_next):
-            if det.get("name") != "title":
-                continue
-            det_index = det.get("index")
-            if det_index is None or (next_idx, det_index) in used_following_ids:
-                continue
-
-            det_bbox = det.get("bbox")
-            if not det_bbox or det_bbox[1] > max_top_allowed:
-                continue
-
-            overlap = _horizontal_overlap_ratio(bbox, det_bbox)
-            x_diff = abs(bbox[0] - det_bbox[0])
-            if (
-                overlap < TITLE_TEXT_ASSOCIATION["min_overlap"]
-                and x_diff > CROSS_PAGE_CAPTION_THRESHOLDS["x_tol"]
-            ):
-                continue
-
-            title_candidate = (det, det_index)
-            title_texts = _collect_text_under_title_cross_page(
-                det, sorted_next, idx_sorted, next_idx, used_following_ids
+        title_rows = np.flatnonzero(
+            near_top
+            & (layout.names == "title")
+            & (
+                (overlaps >= title_text_settings["min_overlap"])
+                | (x_diffs <= thresholds["x_tol"])
+            )
+        )
+        if title_rows.size:
+            title_row = int(title_rows[0])
+            title_candidate = (layout.det(title_row), int(layout.indices[title_row]))
+            title_texts = layout.texts_below_title(
+                title_row, used_following_ids.get(next_idx, set()), title_text_settings
             )
-            break
 
         if not caption_candidate and not title_candidate and not title_texts:
             continue
 
-        figure_path = out_dir / elem["image_path"]
-        if not figure_path.exists():
-            continue
+        lazy = "_crop" not in elem
+        figure_img = None
+        if not lazy:
+            figure_img = _crop_image(elem, crops)
+            if figure_img is None:
+                continue
 
-        figure_img = Image.open(figure_path)
-        if figure_img.mode == "CMYK":
-            figure_img = figure_img.convert("RGB")
+        def segment_region(bbox: List[float]):
+            """(region in points, crop or None when lazy); (None, None) if empty."""
+            region = clip_region(next_page_size, bbox, scale)
+            if region is None or lazy:
+                return region, None
+            segment = session.region(next_idx, bbox, scale)
+            return (region, segment) if segment is not None else (None, None)
 
         segments_added = False
 
         if caption_candidate:
             cap_det, cap_index = caption_candidate
-            caption_crop = _crop_pdf_region(page_img, cap_det["bbox"])
-            if caption_crop is not None:
-                figure_img = _append_segment_image(
-                    figure_img, caption_crop, resize_to_base=True
-                )
+            region, caption_crop = segment_region(cap_det["bbox"])
+            if region is not None:
+                if caption_crop is not None:
+                    figure_img = _append_segment_image(
+                        figure_img, caption_crop, resize_to_base=True
+                    )
+                elem["regions"].append(_region_entry(next_idx + 1, region, fit_width=True))
                 elem.setdefault("captions", [])
                 elem["captions"].append(
                     {
@@ -748,14 +2268,16 @@ def attach_cross_page_figure_captions(
                         "page": next_idx + 1,
                     }
                 )
-                used_following_ids.add((next_idx, cap_index))
+                used_following_ids.setdefault(next_idx, set()).add(cap_index)
                 segments_added = True
 
         if title_candidate:
             title_det, title_index = title_candidate
-            title_crop = _crop_pdf_region(page_img, title_det["bbox"])
-            if title_crop is not None:
-                figure_img = _append_segment_image(figure_img, title_crop)
+            region, title_crop = segment_region(title_det["bbox"])
+            if region is not None:
+                if title_crop is not None:
+                    figure_img = _append_segment_image(figure_img, title_crop)
+                elem["regions"].append(_region_entry(next_idx + 1, region))
                 elem.setdefault("titles", [])
                 elem["titles"].append(
                     {
@@ -766,15 +2288,17 @@ def attach_cross_page_figure_captions(
                         "page": next_idx + 1,
                     }
                 )
-                used_following_ids.add((next_idx, title_index))
+                used_following_ids.setdefault(next_idx, set()).add(title_index)
                 segments_added = True
 
             for text_det in title_texts:
                 text_index = text_det.get("index")
-                text_crop = _crop_pdf_region(page_img, text_det["bbox"])
-                if text_crop is None:
+                region, text_crop = segment_region(text_det["bbox"])
+                if region is None:
                     continue
-                figure_img = _append_segment_image(figure_img, text_crop)
+                if text_crop is not None:
+                    figure_img = _append_segment_image(figure_img, text_crop)
+                elem["regions"].append(_region_entry(next_idx + 1, region))
                 elem.setdefault("texts", [])
                 elem["texts"].append(
                     {
@@ -786,15 +2310,16 @@ def attach_cross_page_figure_captions(
                     }
                 )
                 if text_index is not None:
-                    used_following_ids.add((next_idx, text_index))
+                    used_following_ids.setdefault(next_idx, set()).add(text_index)
                 segments_added = True
 
         if not segments_added:
             continue
 
-        figure_img.save(figure_path)
-        elem["width"] = figure_img.width
-        elem["height"] = figure_img.height
+        if figure_img is not None:
+            crops.replace(elem["_crop"], figure_img)
+            elem["width"] = figure_img.width
+            elem["height"] = figure_img.height
 
         span = elem.get("page_span")
         if span:
@@ -805,85 +2330,180 @@ def attach_cross_page_figure_captions(
             new_span = [page for page in (base_page, next_idx + 1) if page is not None]
             elem["page_span"] = new_span
 
-    pdf_doc.close()
     return elements
 
 
-def _stitch_table_pair(
-    base_elem: Dict,
-    candidate_elem: Dict,
-    out_dir: Path,
-    merge_index: int,
-    stitch_type: str,
-) -> Optional[Dict]:
-    """Stitch two table crops either vertically or horizontally."""
-    base_img = _open_table_image(base_elem, out_dir)
-    candidate_img = _open_table_image(candidate_elem, out_dir)
-    if base_img is None or candidate_img is None:
-        return None
+_STITCH_TYPES = (None, "vertical", "horizontal")
 
-    tables_dir = out_dir / "tables"
-    tables_dir.mkdir(parents=True, exist_ok=True)
 
-    if stitch_type == "vertical":
-        target_width = max(base_img.width, candidate_img.width)
-        base_img = _pad_width(base_img, target_width)
-        candidate_img = _pad_width(candidate_img, target_width)
-        merged_height = base_img.height + candidate_img.height
-        stitched = Image.new("RGB", (target_width, merged_height), color=(255, 255, 255))
-        stitched.paste(base_img, (0, 0))
-        stitched.paste(candidate_img, (0, base_img.height))
-    else:
-        target_height = max(base_img.height, candidate_img.height)
-        base_img = _pad_height(base_img, target_height)
-        candidate_img = _pad_height(candidate_img, target_height)
-        merged_width = base_img.width + candidate_img.width
-        stitched = Image.new("RGB", (merged_width, target_height), color=(255, 255, 255))
-        stitched.paste(base_img, (0, 0))
-        stitched.paste(candidate_img, (base_img.width, 0))
-
-    merged_name = (
-        f"page_{base_elem['page']}_to_{candidate_elem['page']}_"
-        f"table_merged_{merge_index}.png"
+def _table_continuation_matrix(
+    prev_tables: List[Dict],
+    next_tables: List[Dict],
+    tolerances: Dict[str, float],
+) -> np.ndarray:
+    """
+    Index into _STITCH_TYPES for every (prev, next) table pair on consecutive pages:
+    1 if next continues prev vertically, 2 horizontally, 0 if it does not continue.
+    """
+    prev = np.asarray([t["bbox_pixels"] for t in prev_tables], dtype=np.float64).reshape(-1, 4)
+    nxt = np.asarray([t["bbox_pixels"] for t in next_tables], dtype=np.float64).reshape(-1, 4)
+    # Integer (x, y, w, h) rects, as the legacy extractor compared them
+    px, py = np.trunc(prev[:, 0]), np.trunc(prev[:, 1])
+    pw, ph = np.trunc(prev[:, 2] - prev[:, 0]), np.trunc(prev[:, 3] - prev[:, 1])
+    nx, ny = np.trunc(nxt[:, 0]), np.trunc(nxt[:, 1])
+    nw, nh = np.trunc(nxt[:, 2] - nxt[:, 0]), np.trunc(nxt[:, 3] - nxt[:, 1])
+
+    vertical = (
+        (np.abs(px[:, None] - nx[None, :]) <= tolerances["x_tol"])
+        & (np.abs((px + pw)[:, None] - (nx + nw)[None, :]) <= tolerances["width_tol"])
     )
-    merged_path = tables_dir / merged_name
-    stitched.save(merged_path)
-
-    # Remove original partial crops to avoid duplicates
-    (out_dir / base_elem["image_path"]).unlink(missing_ok=True)
-    (out_dir / candidate_elem["image_path"]).unlink(missing_ok=True)
-
-    new_bbox = [
-        min(base_elem["bbox_pixels"][0], candidate_elem["bbox_pixels"][0]),
-        min(base_elem["bbox_pixels"][1], candidate_elem["bbox_pixels"][1]),
-        max(base_elem["bbox_pixels"][2], candidate_elem["bbox_pixels"][2]),
-        max(base_elem["bbox_pixels"][3], candidate_elem["bbox_pixels"][3]),
-    ]
+    horizontal = (
+        (np.abs(py[:, None] - ny[None, :]) <= tolerances["y_tol"])
+        & (np.abs((py + ph)[:, None] - (ny + nh)[None, :]) <= tolerances["height_tol"])
+    )
+    return np.where(vertical, 1, np.where(horizontal, 2, 0))
+
+
+def _build_table_chains(
+    tables_by_page: Dict[int, List[Dict]],
+    tolerances: Dict[str, float],
+) -> List[Tuple[List[Dict], Optional[str]]]:
+    """
+    Group table fragments into continuation chains across consecutive pages.
+    Each chain follows one stitch direction; a fragment joins at most one chain.
+    Returns (fragments, stitch_type) in page order; single tables have type None.
+    """
+    claimed: Set[int] = set()
+    chains: List[Tuple[List[Dict], Optional[str]]] = []
+    links = {
+        page: _table_continuation_matrix(tables, tables_by_page[page + 1], tolerances)
+        for page, tables in tables_by_page.items()
+        if page + 1 in tables_by_page
+    }
+    positions = {
+        id(table): pos for tables in tables_by_page.values() for pos, table in enumerate(tables)
+    }
+
+    for page in sorted(tables_by_page.keys()):
+        for table_elem in tables_by_page[page]:
+            if id(table_elem) in claimed:
+                continue
+            claimed.add(id(table_elem))
+            chain = [table_elem]
+            stitch_type: Optional[str] = None
+
+            while chain[-1]["page"] in links:
+                last = chain[-1]
+                row = links[last["page"]][positions[id(last)]]
+                next_match = None
+                for pos in np.flatnonzero(row):
+                    candidate = tables_by_page[last["page"] + 1][pos]
+                    link_type = _STITCH_TYPES[row[pos]]
+                    if id(candidate) in claimed:
+                        continue
+                    if stitch_type is not None and link_type != stitch_type:
+                        continue
+                    next_match = (candidate, link_type)
+                    break
+                if next_match is None:
+                    break
+                candidate, stitch_type = next_match
+                claimed.add(id(candidate))
+                chain.append(candidate)
+
+            chains.append((chain, stitch_type))
+
+    return chains
+
 
-    merged_elem = base_elem.copy()
-    merged_elem["page_span"] = [base_elem["page"], candidate_elem["page"]]
+def _stitch_table_chain(
+    chain: List[Dict],
+    crops: CropStore,
+    merge_index: int,
+    stitch_type: str,
+) -> Optional[Dict]:
+    """
+    Compose all fragments of one logical table into a single image, allocated
+    once at its final size, vertically or horizontally. Fragments without pending
+    crops (lazy_crops) are only merged into one element with all their regions.
+    """
+    stitched = None
+    if all("_crop" in elem for elem in chain):
+        images = [_crop_image(elem, crops) for elem in chain]
+        if any(img is None for img in images):
+            return None
+        stitched = _concat_images(images, stitch_type)
+
+        # The partial crops are never written; only the merged image is
+        for elem in chain:
+            crops.discard(elem["_crop"])
+
+    first, last = chain[0], chain[-1]
+    merged_name = f"page_{first['page']}_to_{last['page']}_table_merged_{merge_index}.png"
+    merged_path = Path("tables") / merged_name
+
+    merged_elem = first.copy()
+    merged_elem["page_span"] = [first["page"], last["page"]]
     merged_elem["box_refs"] = [
-        {"page": base_elem["page"], "image_path": base_elem["image_path"]},
-        {"page": candidate_elem["page"], "image_path": candidate_elem["image_path"]},
+        {"page": elem["page"], "image_path": elem["image_path"]} for elem in chain
     ]
-    merged_elem["bbox_pixels"] = new_bbox
-    merged_elem["image_path"] = str(merged_path.relative_to(out_dir))
-    merged_elem["width"] = stitched.width
-    merged_elem["height"] = stitched.height
-    merged_elem["page_height"] = stitched.height
-    merged_elem["conf"] = min(
-        base_elem.get("conf", 1.0), candidate_elem.get("conf", 1.0)
-    )
+    merged_elem["bbox_pixels"] = [
+        min(elem["bbox_pixels"][0] for elem in chain),
+        min(elem["bbox_pixels"][1] for elem in chain),
+        max(elem["bbox_pixels"][2] for elem in chain),
+        max(elem["bbox_pixels"][3] for elem in chain),
+    ]
+    merged_elem["bbox_points"] = [
+        min(elem["bbox_points"][0] for elem in chain),
+        min(elem["bbox_points"][1] for elem in chain),
+        max(elem["bbox_points"][2] for elem in chain),
+        max(elem["bbox_points"][3] for elem in chain),
+    ]
+    merged_elem["regions"] = [region for elem in chain for region in elem["regions"]]
+    merged_elem["stitch"] = stitch_type
+    merged_elem["image_path"] = str(merged_path)
+    if stitched is not None:
+        merged_elem["_crop"] = crops.put(stitched)
+        merged_elem["width"] = stitched.width
+        merged_elem["height"] = stitched.height
+        merged_elem["page_height"] = stitched.height
+    merged_elem["conf"] = min(elem.get("conf", 1.0) for elem in chain)
     return merged_elem
 
 
-def merge_spanning_tables(elements: List[Dict], out_dir: Path) -> List[Dict]:
+def _concat_images(images: Sequence[Image.Image], stitch_type: str) -> Image.Image:
+    """Images side by side ("horizontal") or stacked ("vertical") on white, top/left aligned."""
+    if stitch_type == "vertical":
+        size = (max(img.width for img in images), sum(img.height for img in images))
+    else:
+        size = (sum(img.width for img in images), max(img.height for img in images))
+    stitched = Image.new("RGB", size, color=(255, 255, 255))
+    offset = 0
+    for img in images:
+        if stitch_type == "vertical":
+            stitched.paste(img, (0, offset))
+            offset += img.height
+        else:
+            stitched.paste(img, (offset, 0))
+            offset += img.width
+    return stitched
+
+
+def merge_spanning_tables(
+    elements: List[Dict],
+    crops: CropStore,
+    tolerances: Optional[Dict[str, float]] = None,
+) -> List[Dict]:
     """
-    Stitch table crops that continue across adjacent pages using the heuristic
-    from the legacy OpenCV-based extractor.
+    Stitch table crops that continue across consecutive pages using the heuristic
+    from the legacy OpenCV-based extractor. Continuation fragments are grouped into
+    chains first, so a table spanning any number of pages becomes one element and
+    one image. Works on the pending crops in `crops`.
     """
     if not elements:
         return elements
+    if tolerances is None:
+        tolerances = TABLE_STITCH_TOLERANCES
 
     tables_by_page: Dict[int, List[Dict]] = {}
     non_tables: List[Dict] = []
@@ -899,158 +2519,455 @@ def merge_spanning_tables(elements: List[Dict], out_dir: Path) -> List[Dict]:
         tables_by_page.setdefault(page, []).append(elem)
 
     merged_results: List[Dict] = []
-    used_next: Dict[int, set[int]] = {}
     merge_counter = 0
 
-    for page in sorted(tables_by_page.keys()):
-        current_tables = tables_by_page.get(page, [])
-        next_page_tables = tables_by_page.get(page + 1, [])
-        next_used_indices = used_next.get(page + 1, set())
-        current_used_indices = used_next.get(page, set())
+    for chain, stitch_type in _build_table_chains(tables_by_page, tolerances):
+        if stitch_type is None:
+            merged_results.extend(chain)
+            continue
 
-        for idx_current, table_elem in enumerate(current_tables):
-            if idx_current in current_used_indices:
-                continue
+        merged_elem = _stitch_table_chain(chain, crops, merge_counter + 1, stitch_type)
+        if merged_elem is None:
+            merged_results.extend(chain)
+            continue
+        merge_counter += 1
+        if len(chain) > 2:
+            logger.debug(
+                f"Stitched table across pages {chain[0]['page']}-{chain[-1]['page']}"
+            )
+        merged_results.append(merged_elem)
 
-            if not next_page_tables:
-                merged_results.append(table_elem)
-                continue
+    merged_results.extend(non_tables)
+    return merged_results
 
-            x, y, w, h = _bbox_to_rect(table_elem["bbox_pixels"])
-            matched = False
 
-            for idx, candidate in enumerate(next_page_tables):
-                if idx in next_used_indices:
-                    continue
-                if candidate.get("type") != "table":
-                    continue
 
-                cx, cy, cw, ch = _bbox_to_rect(candidate["bbox_pixels"])
+# ----------------------------------------------------------------------
+# Draw layout boxes on the original PDF
+# ----------------------------------------------------------------------
+def draw_layout_pdf(session: DocumentSession, all_dets: Sequence[Optional[PageDetections]],
+                    scale: float, out_path: Path, pages: Optional[Sequence[int]] = None):
+    """
+    Annotate PDF with semi-transparent bounding boxes and labels.
+    `all_dets` is indexed by page; with `pages` (0-based) only those pages are drawn
+    and saved. Draws onto the session's PyMuPDF document, which is dropped afterwards
+    so no later user sees the annotations.
+    """
+    page_numbers = range(len(all_dets)) if pages is None else pages
+    with _FITZ_LOCK:
+        doc = session.fitz
 
-                vertical_match = (
-                    abs(x - cx) <= TABLE_STITCH_TOLERANCES["x_tol"]
-                    and abs((x + w) - (cx + cw)) <= TABLE_STITCH_TOLERANCES["width_tol"]
-                )
-                horizontal_match = (
-                    abs(y - cy) <= TABLE_STITCH_TOLERANCES["y_tol"]
-                    and abs((y + h) - (cy + ch))
-                    <= TABLE_STITCH_TOLERANCES["height_tol"]
+        for page_no in page_numbers:
+            dets = all_dets[page_no]
+            if not dets:
+                continue
+            page = doc[page_no]
+
+            for d in dets.to_dicts():
+                rgb = CLASS_COLORS.get(d["name"], (0, 0, 0))
+                rect = fitz.Rect([c / scale for c in d["bbox"]])
+
+                border_color = [c / 255 for c in rgb]
+                fill_color = [c / 255 for c in rgb]
+                fill_opacity = 0.15
+                border_width = 1.5
+
+                page.draw_rect(
+                    rect,
+                    color=border_color,
+                    fill=fill_color,
+                    width=border_width,
+                    overlay=True,
+                    fill_opacity=fill_opacity
                 )
 
-                stitch_type = "vertical" if vertical_match else None
-                if not stitch_type and horizontal_match:
-                    stitch_type = "horizontal"
+                label = f"{d['name']} {d['conf']:.2f}"
+                if d.get("source"):
+                    label += f" [{d['source'][0].upper()}]"
 
-                if not stitch_type:
-                    continue
+                text_bg = fitz.Rect(rect.x0, rect.y0 - 10, rect.x0 + 60, rect.y0)
+                page.draw_rect(text_bg, color=None, fill=(1, 1, 1, 0.6), overlay=True)
 
-                merge_counter += 1
-                merged_elem = _stitch_table_pair(
-                    table_elem, candidate, out_dir, merge_counter, stitch_type
+                page.insert_text(
+                    (rect.x0 + 2, rect.y0 - 8),
+                    label,
+                    fontsize=6.5,
+                    color=border_color,
+                    overlay=True
                 )
-                if merged_elem is None:
-                    continue
 
-                merged_results.append(merged_elem)
-                next_used_indices.add(idx)
-                matched = True
-                break
+        if pages is not None:
+            doc.select(list(pages))
+        doc.save(str(out_path))
+        session.release_fitz()
 
-            if not matched:
-                merged_results.append(table_elem)
 
-        used_next[page + 1] = next_used_indices
+def parse_page_range(text: str, page_count: int) -> Tuple[int, int]:
+    """1-based inclusive (first, last) from "3-7", "5", "3-" or "-7", clamped to the document."""
+    first_text, sep, last_text = text.strip().partition("-")
+    first = int(first_text) if first_text.strip() else 1
+    last = int(last_text) if last_text.strip() else (page_count if sep else first)
+    first, last = max(1, first), min(page_count, last)
+    if first > last:
+        raise ValueError(f"Page range {text!r} is empty for a {page_count}-page document")
+    return first, last
 
-    merged_results.extend(non_tables)
-    return merged_results
 
+def layout_pdf_name(stem: str, page_range: Optional[Tuple[int, int]] = None) -> str:
+    if page_range is None:
+        return f"{stem}_layout.pdf"
+    return f"{stem}_layout_p{page_range[0]}-{page_range[1]}.pdf"
 
 
+def build_layout_pdf(out_dir: Path, pages: Optional[str] = None) -> Optional[Path]:
+    """
+    Annotated layout PDF of a processed document, drawn from its saved detections the
+    first time it is asked for and kept until the detections change. `pages` ("3-7")
+    builds a separate PDF of just that range. None without detections or source PDF;
+    ValueError for a bad range.
+    """
+    detections = list(out_dir.glob("*_detections.json"))
+    if not detections:
+        return None
+    detections_path = detections[0]
+    stem = detections_path.name[: -len("_detections.json")]
+
+    all_dets = None
+    page_range = None
+    if pages:
+        all_dets, scale = load_raw_detections(detections_path)
+        page_range = parse_page_range(pages, len(all_dets))
+    path = out_dir / layout_pdf_name(stem, page_range)
+
+    with _layout_pdf_locks.hold(path):
+        if path.exists() and path.stat().st_mtime >= detections_path.stat().st_mtime:
+            return path
+
+        pdf_path = source_pdf(out_dir)
+        if pdf_path is None:
+            return None
+        if all_dets is None:
+            all_dets, scale = load_raw_detections(detections_path)
+        page_numbers = None
+        if page_range is not None:
+            page_numbers = range(page_range[0] - 1, page_range[1])
+        tmp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+        with DocumentSession(pdf_path) as session:
+            draw_layout_pdf(session, all_dets, scale, tmp_path, page_numbers)
+        os.replace(tmp_path, path)
+    logger.info(f"Built {path.name} from {detections_path.name}")
+    return path
+
 # ----------------------------------------------------------------------
-# Draw layout boxes on the original PDF
+# Process a batch of PDF pages (for parallel execution)
 # ----------------------------------------------------------------------
-def draw_layout_pdf(pdf_bytes: bytes, all_dets: List[List[dict]],
-                    scale: float, out_path: Path):
-    """Annotate PDF with semi-transparent bounding boxes and labels."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-    for page_no, dets in enumerate(all_dets):
-        page = doc[page_no]
-
-        for d in dets:
-            rgb = CLASS_COLORS.get(d["name"], (0, 0, 0))
-            rect = fitz.Rect([c / scale for c in d["bbox"]])
-
-            border_color = [c / 255 for c in rgb]
-            fill_color = [c / 255 for c in rgb]
-            fill_opacity = 0.15
-            border_width = 1.5
-
-            page.draw_rect(
-                rect,
-                color=border_color,
-                fill=fill_color,
-                width=border_width,
-                overlay=True,
-                fill_opacity=fill_opacity
-            )
-
-            label = f"{d['name']} {d['conf']:.2f}"
-            if d.get("source"):
-                label += f" [{d['source'][0].upper()}]"
+def _log_page_counts(pdf_name: str, pno: int, dets: PageDetections):
+    page_figures = dets.count("figure")
+    page_tables = dets.count("table")
+    logger.info(f"  [{pdf_name}] Page {pno + 1}: {page_figures} figs, {page_tables} tables")
 
-            text_bg = fitz.Rect(rect.x0, rect.y0 - 10, rect.x0 + 60, rect.y0)
-            page.draw_rect(text_bg, color=None, fill=(1, 1, 1, 0.6), overlay=True)
 
-            page.insert_text(
-                (rect.x0 + 2, rect.y0 - 8),
-                label,
-                fontsize=6.5,
-                color=border_color,
-                overlay=True
-            )
+def document_key(pdf_path: Path) -> Tuple[str, int, int]:
+    """Identity of a PDF on disk: resolved path, size and modification time."""
+    stat = pdf_path.stat()
+    return (str(pdf_path.resolve()), stat.st_size, stat.st_mtime_ns)
 
-    doc.save(str(out_path))
-    doc.close()
 
-# ----------------------------------------------------------------------
-# Process a single PDF Page (for parallel execution)
-# ----------------------------------------------------------------------
-def process_page(task_data: Tuple[int, bytes, float, Path, str]) -> Optional[Tuple[int, List[dict], List[dict]]]:
+def get_worker_document(pdf_path: Path, doc_key: Tuple[str, int, int]) -> pdfium.PdfDocument:
+    """
+    Return an open PdfDocument for this worker, reusing it across page tasks.
+    pdfium reads the file lazily, so nothing is copied between processes.
     """
-    Process a single page of a PDF in a worker process.
-    Returns: (page_number, detections, elements) or None on failure
+    doc = _worker_docs.get(doc_key)
+    if doc is not None:
+        _worker_docs.move_to_end(doc_key)
+        return doc
+
+    if not _worker_docs:
+        atexit.register(close_worker_documents)
+    doc = pdfium.PdfDocument(str(pdf_path))
+    _worker_docs[doc_key] = doc
+    while len(_worker_docs) > max(1, WORKER_DOC_CACHE_SIZE):
+        _, old_doc = _worker_docs.popitem(last=False)
+        old_doc.close()
+    return doc
+
+
+def close_worker_documents():
+    """Close every document cached by get_worker_document."""
+    while _worker_docs:
+        _, doc = _worker_docs.popitem()
+        doc.close()
+
+
+def process_page_batch(
+    task_data: Tuple[List[int], Path, Tuple[str, int, int], Optional[str], float, Path, str, bool]
+) -> List[Tuple[int, PageDetections, List[dict], Dict[str, dict]]]:
     """
-    pno, pdf_bytes, scale, out_dir, pdf_name = task_data
+    Process a batch of pages of a PDF in a worker process.
+    All pages of the batch go through the model in one forward pass. Crops that
+    document-wide stitching cannot change are written here; the rest come back as images.
+    Returns: [(page_number, detections, elements, events), ...] for pages that succeeded,
+    where events maps "page_rendered"/"page_detected" to that progress event's fields
+    """
+    page_numbers, pdf_path, doc_key, pdf_hash, scale, out_dir, pdf_name, lazy_crops = task_data
     
     if _shutdown_requested:
-        return None
+        return []
     
-    pdf_pdfium = None
+    rendered: List[Tuple[int, Optional[Image.Image], float]] = []
+    render_events: Dict[int, dict] = {}
     try:
-        pdf_pdfium = pdfium.PdfDocument(pdf_bytes)
-        
-        page = pdf_pdfium[pno]
-        bitmap = page.render(scale=scale)
-        pil = bitmap.to_pil()
+        pdf_pdfium = get_worker_document(pdf_path, doc_key)
+        det_scales, cached = plan_detection(pdf_pdfium, page_numbers, pdf_hash)
 
-        dets = detect_page(pil)
-        elements = save_layout_elements(pil, pno, dets, out_dir)
-        
-        page_figures = len([d for d in dets if d['name'] == 'figure'])
-        page_tables = len([d for d in dets if d['name'] == 'table'])
-        logger.info(f"  [{pdf_name}] Page {pno + 1}: {page_figures} figs, {page_tables} tables")
+        for pno in page_numbers:
+            if pno in cached:
+                rendered.append((pno, None, det_scales[pno]))
+                render_events[pno] = {"seconds": 0.0, "cached": True}
+                continue
+            try:
+                start = time.perf_counter()
+                page = pdf_pdfium[pno]
+                rendered.append((pno, *render_for_detection(page)))
+                page.close()
+                render_events[pno] = {"seconds": round(time.perf_counter() - start, 3)}
+            except Exception as e:
+                logger.error(f"Failed to render page {pno + 1} of {pdf_name}: {e}")
 
-        page.close()
-        pdf_pdfium.close()
-        
-        return (pno, dets, elements)
+        start = time.perf_counter()
+        batch_dets = detect_rendered_pages(rendered, pdf_hash, scale, cached=cached)
+        detect_seconds = round(time.perf_counter() - start, 3)
+        page_numbers_done = [pno for pno, _, _ in rendered]
+        rendered.clear()  # Detection rasters are no longer needed
+
+        results = []
+        batch_elements: List[Dict] = []
+        for pno, dets in zip(page_numbers_done, batch_dets):
+            try:
+                page = pdf_pdfium[pno]
+                elements = save_layout_elements(
+                    page, pno, dets, out_dir, scale=scale, lazy_crops=lazy_crops
+                )
+                page.close()
+            except Exception as e:
+                logger.error(f"Failed to save elements of page {pno + 1} of {pdf_name}: {e}")
+                continue
+            _log_page_counts(pdf_name, pno, dets)
+            events = {
+                "page_rendered": render_events[pno],
+                "page_detected": {
+                    "detections": len(dets),
+                    "batch_pages": len(page_numbers_done),
+                    "seconds": detect_seconds,
+                },
+            }
+            results.append((pno, dets, elements, events))
+            batch_elements.extend(elements)
+
+        # Only crops that stitching may still change travel back to the parent unencoded
+        write_settled_element_images(
+            batch_elements, dict(zip(page_numbers_done, batch_dets)), len(pdf_pdfium), out_dir
+        )
+        return results
 
     except Exception as e:
-        logger.error(f"Failed to process page {pno + 1} of {pdf_name}: {e}")
-        if pdf_pdfium:
-            pdf_pdfium.close()
-        return None
+        pages = ", ".join(str(pno + 1) for pno in page_numbers)
+        logger.error(f"Failed to process pages {pages} of {pdf_name}: {e}")
+        return []
+
+# ----------------------------------------------------------------------
+# Pipelined serial processing: render → detect → save
+# ----------------------------------------------------------------------
+_PIPELINE_DONE = object()  # Sentinel closing a pipeline queue
+
+
+def _put_unless_stopped(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Put an item on a bounded queue, giving up once the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _render_stage(
+    pdf_pdfium: pdfium.PdfDocument,
+    page_count: int,
+    batch_size: int,
+    out_q: queue.Queue,
+    stop: threading.Event,
+    emit: Callable[..., None],
+    pdf_hash: Optional[str] = None,
+):
+    """
+    Render page batches at detection resolution ahead of the detector, skipping pages
+    with cached detections. Each batch goes out as (rendered, cached detections).
+    """
+    try:
+        for batch_start in range(0, page_count, batch_size):
+            if _shutdown_requested or stop.is_set():
+                break
+
+            batch_pages = range(batch_start, min(batch_start + batch_size, page_count))
+            det_scales, cached = plan_detection(pdf_pdfium, batch_pages, pdf_hash)
+            rendered: List[Tuple[int, Optional[Image.Image], float]] = []
+            for pno in batch_pages:
+                if pno in cached:
+                    rendered.append((pno, None, det_scales[pno]))
+                    emit("page_rendered", page=pno + 1, seconds=0.0, cached=True)
+                    continue
+                try:
+                    start = time.perf_counter()
+                    with _PDFIUM_LOCK:
+                        page = pdf_pdfium[pno]
+                        rendered.append((pno, *render_for_detection(page)))
+                        page.close()
+                    emit("page_rendered", page=pno + 1, seconds=round(time.perf_counter() - start, 3))
+                except Exception as e:
+                    logger.error(f"Failed to render page {pno + 1}: {e}. Skipping page.")
+
+            if rendered and not _put_unless_stopped(out_q, (rendered, cached), stop):
+                break
+    except Exception as e:
+        logger.error(f"Render stage failed: {e}")
+    finally:
+        _put_unless_stopped(out_q, _PIPELINE_DONE, stop)
+
+
+def _save_stage(
+    pdf_pdfium: pdfium.PdfDocument,
+    scale: float,
+    in_q: queue.Queue,
+    out_dir: Path,
+    all_dets: List[Optional[PageDetections]],
+    all_elements: List[Dict],
+    crops: CropStore,
+    page_count: int,
+    emit_page: Callable[..., None],
+    lazy_crops: bool = False,
+):
+    """Render figure/table crops into the crop store as detections arrive."""
+    while True:
+        item = in_q.get()
+        if item is _PIPELINE_DONE:
+            break
+        for pno, dets in item:
+            try:
+                start = time.perf_counter()
+                all_dets[pno] = dets
+                with _PDFIUM_LOCK:
+                    page = pdf_pdfium[pno]
+                try:
+                    elements = save_layout_elements(
+                        page, pno, dets, out_dir, scale=scale, lazy_crops=lazy_crops
+                    )
+                finally:
+                    with _PDFIUM_LOCK:
+                        page.close()
+                crops.adopt(elements)
+                all_elements.extend(elements)
+                emit_page(pno, dets, elements, time.perf_counter() - start)
+
+                page_figures = dets.count("figure")
+                page_tables = dets.count("table")
+                logger.info(
+                    f"    Page {pno + 1}/{page_count}: found {page_figures} figures "
+                    f"and {page_tables} tables"
+                )
+            except Exception as e:
+                logger.error(f"Failed to process page {pno + 1}: {e}. Skipping page.")
+
+
+def process_pages_pipelined(
+    session: DocumentSession,
+    scale: float,
+    out_dir: Path,
+    all_dets: List[Optional[PageDetections]],
+    all_elements: List[Dict],
+    crops: CropStore,
+    pdf_hash: Optional[str] = None,
+    lazy_crops: bool = False,
+):
+    """
+    Run rendering, detection and crop saving as overlapping stages.
+    A render thread and a save thread sit on either side of the detector (this thread),
+    connected by queues of at most PIPELINE_QUEUE_SIZE page batches.
+    Both threads use the session's document; pdfium calls are serialized by _PDFIUM_LOCK.
+    Fills all_dets and all_elements in place; crops go into `crops`.
+    """
+    pdf_pdfium = session.pdfium
+    page_count = session.page_count
+    batch_size = get_detect_batch_size()
+    render_q: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    save_q: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+
+    renderer = threading.Thread(
+        target=_render_stage,
+        args=(pdf_pdfium, page_count, batch_size, render_q, stop, session.emit, pdf_hash),
+        name="pipeline-render",
+        daemon=True,
+    )
+    saver = threading.Thread(
+        target=_save_stage,
+        args=(
+            pdf_pdfium, scale, save_q, out_dir, all_dets, all_elements, crops, page_count,
+            session.emit_page, lazy_crops,
+        ),
+        name="pipeline-save",
+        daemon=True,
+    )
+    renderer.start()
+    saver.start()
+
+    try:
+        while True:
+            item = render_q.get()
+            if item is _PIPELINE_DONE:
+                break
+            batch, cached = item
+            if _shutdown_requested:
+                logger.warning(
+                    f"Stopping at page {batch[0][0] + 1}/{page_count} due to shutdown request"
+                )
+                break
+
+            try:
+                start = time.perf_counter()
+                batch_dets = detect_rendered_pages(batch, pdf_hash, scale, batch_size, cached)
+            except Exception as e:
+                logger.error(
+                    f"Failed to detect pages {batch[0][0] + 1}-{batch[-1][0] + 1}: "
+                    f"{e}. Skipping pages."
+                )
+                continue
+            _emit_detected(session, batch, batch_dets, time.perf_counter() - start)
+
+            save_q.put([(pno, dets) for (pno, _, _), dets in zip(batch, batch_dets)])
+    finally:
+        stop.set()
+        renderer.join()
+        save_q.put(_PIPELINE_DONE)
+        saver.join()
+
+def _emit_detected(
+    session: DocumentSession,
+    rendered: Sequence[Tuple[int, Image.Image, float]],
+    batch_dets: Sequence[PageDetections],
+    seconds: float,
+):
+    """One "page_detected" event per page; `seconds` is the time of the whole batch."""
+    for (pno, _, _), dets in zip(rendered, batch_dets):
+        session.emit(
+            "page_detected",
+            page=pno + 1,
+            detections=len(dets),
+            batch_pages=len(rendered),
+            seconds=round(seconds, 3),
+        )
 
 # ----------------------------------------------------------------------
 # Process a full PDF using the persistent worker pool
@@ -1062,140 +2979,292 @@ def process_pdf_with_pool(
     *,
     extract_images: bool = True,
     extract_markdown: bool = True,
+    lazy_crops: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
 ):
     """
     Main processing pipeline for a PDF file.
     If pool is provided, uses it. Otherwise processes serially.
+    With lazy_crops, figure/table images are not rendered (see LAZY_CROPS).
+    `progress` receives per-page and per-stage events as dicts (see DocumentSession.emit).
     """
     
     if _shutdown_requested:
         logger.warning(f"Skipping {pdf_path.name} due to shutdown request")
         return
     
-    stem = pdf_path.stem
     logger.info(f"Processing {pdf_path.name}")
 
-    pdf_bytes = pdf_path.read_bytes()
-    
-    doc = None
     try:
-        doc = pdfium.PdfDocument(pdf_bytes)
-        page_count = len(doc)
+        session = DocumentSession(pdf_path)
     except Exception as e:
         logger.error(f"Failed to open PDF {pdf_path.name}: {e}. Skipping.")
         return
+
+    session.progress = progress
+    start = time.perf_counter()
+    session.emit(
+        "started",
+        file=pdf_path.name,
+        pages=session.page_count,
+        images=extract_images,
+        markdown=extract_markdown,
+    )
+    try:
+        _process_document(
+            session, out_dir, pool, extract_images, extract_markdown, lazy_crops
+        )
     finally:
-        if doc is not None:
-            doc.close()
+        session.close()
+    session.emit("finished", seconds=round(time.perf_counter() - start, 3))
+
 
-    scale = 2.0
+def _process_document(
+    session: DocumentSession,
+    out_dir: Path,
+    pool: Optional[Pool],
+    extract_images: bool,
+    extract_markdown: bool,
+    lazy_crops: bool = False,
+):
+    """Detection and extraction for one open document (see process_pdf_with_pool)."""
+    pdf_path = session.path
+    page_count = session.page_count
+    pdf_hash = session.sha256 if USE_DETECTION_CACHE else None
+    scale = LAYOUT_SCALE
+
+    # Markdown only needs the file, so it overlaps with the whole image pipeline
+    markdown_job = None
+    if extract_markdown and not markdown_from_detections(extract_images):
+        markdown_job = submit_markdown(
+            session,
+            out_dir,
+            on_page=lambda pno, _text: session.emit("markdown_page", page=pno + 1),
+        )
     all_elements: List[Dict] = []
-    filtered_dets: List[List[dict]] = []
+    crops = CropStore()
 
     if extract_images:
-        all_dets: List[Optional[List[dict]]] = [None] * page_count
+        all_dets: List[Optional[PageDetections]] = [None] * page_count
 
         if pool is not None and USE_MULTIPROCESSING:
             logger.info(f"  Using worker pool for {page_count} pages...")
 
+            # Workers open the file themselves; only the path travels over the pipe
+            doc_key = document_key(pdf_path)
+            chunk_size = _page_chunk_size(page_count, pool)
             tasks = [
-                (pno, pdf_bytes, scale, out_dir, pdf_path.name)
-                for pno in range(page_count)
+                (
+                    page_numbers, pdf_path, doc_key, pdf_hash, scale, out_dir, pdf_path.name,
+                    lazy_crops,
+                )
+                for page_numbers in _page_batches(page_count, chunk_size)
             ]
 
             try:
-                results = pool.map(process_page, tasks)
-
-                for res in results:
-                    if res:
-                        pno, dets, elements = res
+                for batch_results in pool.imap(process_page_batch, tasks):
+                    for pno, dets, elements, events in batch_results:
+                        for event, fields in events.items():
+                            session.emit(event, page=pno + 1, **fields)
                         all_dets[pno] = dets
+                        crops.adopt(elements)
                         all_elements.extend(elements)
+                        session.emit_page(pno, dets, elements)
 
             except KeyboardInterrupt:
                 logger.warning("Processing interrupted during parallel execution")
                 raise
 
+        elif USE_PIPELINE:
+            logger.info("Using pipelined serial processing...")
+            process_pages_pipelined(
+                session, scale, out_dir, all_dets, all_elements, crops, pdf_hash, lazy_crops
+            )
+
         else:
             logger.info("Using serial processing...")
 
             try:
-                pdf_pdfium = pdfium.PdfDocument(pdf_bytes)
+                pdf_pdfium = session.pdfium
+                batch_size = get_detect_batch_size()
 
-                for pno in range(page_count):
+                for batch_start in range(0, page_count, batch_size):
                     if _shutdown_requested:
                         logger.warning(
-                            f"Stopping at page {pno + 1}/{page_count} due to shutdown request"
+                            f"Stopping at page {batch_start + 1}/{page_count} due to shutdown request"
                         )
                         break
 
-                    try:
-                        logger.info(f"  Processing page {pno + 1}/{page_count}")
-
-                        page = pdf_pdfium[pno]
-                        bitmap = page.render(scale=scale)
-                        pil = bitmap.to_pil()
-
-                        dets = detect_page(pil)
-                        all_dets[pno] = dets
-
-                        elements = save_layout_elements(pil, pno, dets, out_dir)
-                        all_elements.extend(elements)
+                    batch_pages = range(batch_start, min(batch_start + batch_size, page_count))
+                    det_scales, cached = plan_detection(pdf_pdfium, batch_pages, pdf_hash)
+                    rendered: List[Tuple[int, Optional[Image.Image], float]] = []
+                    for pno in batch_pages:
+                        if pno in cached:
+                            rendered.append((pno, None, det_scales[pno]))
+                            session.emit("page_rendered", page=pno + 1, seconds=0.0, cached=True)
+                            continue
+                        try:
+                            logger.info(f"  Rendering page {pno + 1}/{page_count}")
+                            start = time.perf_counter()
+                            page = pdf_pdfium[pno]
+                            rendered.append((pno, *render_for_detection(page)))
+                            page.close()
+                            session.emit(
+                                "page_rendered",
+                                page=pno + 1,
+                                seconds=round(time.perf_counter() - start, 3),
+                            )
+                        except Exception as e:
+                            logger.error(f"Failed to render page {pno + 1}: {e}. Skipping page.")
 
-                        page_figures = len([d for d in dets if d["name"] == "figure"])
-                        page_tables = len([d for d in dets if d["name"] == "table"])
-                        logger.info(
-                            f"    Found {page_figures} figures and {page_tables} tables"
+                    try:
+                        start = time.perf_counter()
+                        batch_dets = detect_rendered_pages(
+                            rendered, pdf_hash, scale, batch_size, cached
                         )
-
-                        page.close()
-
                     except Exception as e:
-                        logger.error(f"Failed to process page {pno + 1}: {e}. Skipping page.")
-
-                pdf_pdfium.close()
+                        logger.error(
+                            f"Failed to detect pages {batch_start + 1}-{batch_start + len(rendered)}: "
+                            f"{e}. Skipping pages."
+                        )
+                        continue
+                    _emit_detected(session, rendered, batch_dets, time.perf_counter() - start)
+
+                    for (pno, _, _), dets in zip(rendered, batch_dets):
+                        try:
+                            start = time.perf_counter()
+                            all_dets[pno] = dets
+
+                            page = pdf_pdfium[pno]
+                            elements = save_layout_elements(
+                                page, pno, dets, out_dir, scale=scale, lazy_crops=lazy_crops
+                            )
+                            page.close()
+                            crops.adopt(elements)
+                            all_elements.extend(elements)
+                            session.emit_page(pno, dets, elements, time.perf_counter() - start)
+
+                            page_figures = dets.count("figure")
+                            page_tables = dets.count("table")
+                            logger.info(
+                                f"    Page {pno + 1}: found {page_figures} figures and {page_tables} tables"
+                            )
+
+                        except Exception as e:
+                            logger.error(f"Failed to process page {pno + 1}: {e}. Skipping page.")
 
             except Exception as e:
                 logger.error(f"Fatal error processing {pdf_path.name}: {e}")
-                if "pdf_pdfium" in locals() and pdf_pdfium:
-                    pdf_pdfium.close()
+                crops.close()
+                if markdown_job is not None:
+                    markdown_job.cancel()
                 return
 
-        dets_per_page: List[Optional[List[Dict[str, Any]]]] = [
-            det if det is not None else None for det in all_dets
-        ]
+    else:
+        all_dets = []
+        logger.info("  Image extraction skipped per configuration.")
+
+    try:
+        finalize_document(
+            session,
+            out_dir,
+            all_dets,
+            all_elements,
+            scale,
+            crops,
+            extract_images=extract_images,
+            extract_markdown=extract_markdown,
+            lazy_crops=lazy_crops,
+            markdown_job=markdown_job,
+        )
+    finally:
+        crops.close()
 
-        filtered_dets = [d for d in all_dets if d is not None]
 
-        if all_elements:
-            all_elements = merge_spanning_tables(all_elements, out_dir)
-            all_elements = attach_cross_page_figure_captions(
-                all_elements, dets_per_page, pdf_bytes, out_dir, scale
-            )
+def finalize_document(
+    session: DocumentSession,
+    out_dir: Path,
+    all_dets: List[Optional[PageDetections]],
+    all_elements: List[Dict],
+    scale: float,
+    crops: CropStore,
+    *,
+    extract_images: bool = True,
+    extract_markdown: bool = True,
+    lazy_crops: bool = False,
+    markdown_job: Optional[MarkdownJob] = None,
+):
+    """
+    Document-level steps that need every page: table/caption stitching, the single
+    encode of each crop held in `crops`, the content list JSON, the markdown export
+    and the annotated PDF, all from the session's open documents.
+    With lazy_crops there are no crops; images left from an earlier run are removed.
+    With markdown_job (see submit_markdown), markdown was already started on the
+    markdown processes and is only joined here.
+    """
+    stem = session.path.stem
+    filtered_dets = [d for d in all_dets if d is not None]
 
+    if extract_images:
         if all_elements:
-            content_list_path = out_dir / f"{stem}_content_list.json"
-            with open(content_list_path, "w", encoding="utf-8") as f:
-                json.dump(all_elements, f, ensure_ascii=False, indent=4)
-            logger.info(f"  Saved {len(all_elements)} elements to JSON")
-
-        if filtered_dets:
-            draw_layout_pdf(
-                pdf_bytes, filtered_dets, scale, out_dir / f"{stem}_layout.pdf"
-            )
-            logger.info("  Generated annotated PDF")
-        else:
-            logger.warning(f"No detections found for {stem}. Skipping layout PDF.")
+            with session.timed_stage("stitching"):
+                all_elements = merge_spanning_tables(all_elements, crops)
+                all_elements = attach_cross_page_figure_captions(
+                    all_elements, all_dets, session, crops, scale
+                )
+            with session.timed_stage("images"):
+                if lazy_crops:
+                    remove_element_images(out_dir)
+                else:
+                    write_element_images(all_elements, out_dir, crops)
+
+        with session.timed_stage("content_list"):
+            if all_elements:
+                content_list_path = out_dir / f"{stem}_content_list.json"
+                with open(content_list_path, "w", encoding="utf-8") as f:
+                    json.dump(all_elements, f, ensure_ascii=False, indent=4)
+                logger.info(f"  Saved {len(all_elements)} elements to JSON")
+
+            if filtered_dets:
+                save_raw_detections(
+                    out_dir / f"{stem}_detections.json", all_dets, scale, lazy_crops
+                )
 
-    else:
-        logger.info("  Image extraction skipped per configuration.")
+    cache = get_detection_cache() if extract_images else None
+    if cache is not None:
+        stats = cache.stats()
+        logger.info(
+            f"  Detection cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MB)"
+        )
 
-    markdown_path = None
+    # Markdown reads the PyMuPDF document before the annotated PDF draws onto it
     if extract_markdown:
-        markdown_path = write_markdown_document(pdf_path, out_dir)
+        markdown_path = None
+        with session.timed_stage("markdown"):
+            if markdown_job is not None:
+                markdown_path = join_markdown(markdown_job, session, out_dir)
+            elif markdown_from_detections(extract_images) and filtered_dets:
+                markdown_path = write_markdown_from_detections(
+                    session, out_dir, all_dets, all_elements, scale
+                )
+            else:
+                markdown_path = write_markdown_document(session, out_dir)
         if markdown_path is None:
             logger.warning(f"  Markdown extraction yielded no content for {stem}.")
 
+    if extract_images:
+        if not filtered_dets:
+            logger.warning(f"No detections found for {stem}. Skipping layout PDF.")
+        elif not LAZY_LAYOUT_PDF:
+            with session.timed_stage("layout_pdf"):
+                draw_layout_pdf(session, all_dets, scale, out_dir / layout_pdf_name(stem))
+            logger.info("  Generated annotated PDF")
+
+    record_document(
+        session, out_dir, all_elements if extract_images else None, extract_markdown
+    )
+
     if _shutdown_requested:
         logger.warning(f"⚠️  Partial results saved for {stem} → {out_dir}")
     else:
@@ -1206,10 +3275,620 @@ def process_pdf_with_pool(
         else:
             logger.success(f"✓ {stem} → {out_dir} (image extraction skipped)")
 
+
+# ----------------------------------------------------------------------
+# Re-stitch from persisted raw detections
+# ----------------------------------------------------------------------
+def save_raw_detections(
+    path: Path,
+    all_dets: Sequence[Optional[PageDetections]],
+    scale: float,
+    lazy_crops: bool = False,
+):
+    """
+    Persist per-page raw detections so stitching can be re-run without the model,
+    along with whether that run left crops to be rendered on request.
+    """
+    payload = {
+        "scale": scale,
+        "lazy_crops": lazy_crops,
+        "pages": [None if dets is None else dets.to_dicts() for dets in all_dets],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+
+
+def load_raw_detections(path: Path) -> Tuple[List[Optional[PageDetections]], float]:
+    """Load detections written by save_raw_detections: (per-page detections, scale)."""
+    pages, scale, _ = _load_raw_detections(path)
+    return pages, scale
+
+
+def _load_raw_detections(path: Path) -> Tuple[List[Optional[PageDetections]], float, bool]:
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    pages = [
+        None if dets is None else PageDetections.from_dicts(dets)
+        for dets in payload["pages"]
+    ]
+    return pages, float(payload["scale"]), bool(payload.get("lazy_crops", False))
+
+
+def merge_threshold_overrides(
+    defaults: Dict[str, float], overrides: Optional[Dict[str, float]]
+) -> Dict[str, float]:
+    """Apply threshold overrides on top of the module defaults, rejecting unknown keys."""
+    if not overrides:
+        return dict(defaults)
+    unknown = set(overrides) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown threshold(s): {', '.join(sorted(unknown))}")
+    return {**defaults, **{key: float(value) for key, value in overrides.items()}}
+
+
+def restitch_document(
+    pdf_path: Path,
+    out_dir: Path,
+    *,
+    table_tolerances: Optional[Dict[str, float]] = None,
+    caption_thresholds: Optional[Dict[str, float]] = None,
+    title_text_settings: Optional[Dict[str, float]] = None,
+    lazy_crops: Optional[bool] = None,
+) -> Optional[List[Dict]]:
+    """
+    Rebuild figure/table crops and the content list from persisted raw detections.
+    Only the figure/table regions are rendered (none with lazy_crops); the model is not used.
+    lazy_crops=None keeps the mode of the run that saved the detections.
+    Threshold dicts override TABLE_STITCH_TOLERANCES, CROSS_PAGE_CAPTION_THRESHOLDS
+    and TITLE_TEXT_ASSOCIATION key by key.
+    Returns the new elements, or None when no detections were persisted.
+    """
+    stem = pdf_path.stem
+    detections_path = out_dir / f"{stem}_detections.json"
+    if not detections_path.exists():
+        logger.error(f"No persisted detections for {stem}; run full processing first.")
+        return None
+
+    tolerances = merge_threshold_overrides(TABLE_STITCH_TOLERANCES, table_tolerances)
+    thresholds = merge_threshold_overrides(CROSS_PAGE_CAPTION_THRESHOLDS, caption_thresholds)
+    title_settings = merge_threshold_overrides(TITLE_TEXT_ASSOCIATION, title_text_settings)
+
+    all_dets, scale, saved_lazy = _load_raw_detections(detections_path)
+    if lazy_crops is None:
+        lazy_crops = saved_lazy
+    logger.info(f"Re-stitching {stem} from {detections_path.name}")
+
+    # Crops from the previous run may carry different (merged) names
+    remove_element_images(out_dir)
+
+    all_elements: List[Dict] = []
+    crops = CropStore()
+    try:
+        with DocumentSession(pdf_path) as session:
+            for pno, dets in enumerate(all_dets):
+                if not dets or not (dets.count("figure") or dets.count("table")):
+                    continue
+                page = session.page(pno)
+                elements = save_layout_elements(
+                    page, pno, dets, out_dir, title_settings, scale, lazy_crops
+                )
+                page.close()
+                crops.adopt(elements)
+                all_elements.extend(elements)
+
+            if all_elements:
+                all_elements = merge_spanning_tables(all_elements, crops, tolerances)
+                all_elements = attach_cross_page_figure_captions(
+                    all_elements, all_dets, session, crops, scale, thresholds, title_settings
+                )
+                write_element_images(all_elements, out_dir, crops)
+
+            # Links in markdown built from detections follow the new crop names
+            md_path = out_dir / f"{stem}.md"
+            if md_path.exists() and markdown_from_detections(True):
+                write_markdown_from_detections(session, out_dir, all_dets, all_elements, scale)
+    finally:
+        crops.close()
+
+    content_list_path = out_dir / f"{stem}_content_list.json"
+    with open(content_list_path, "w", encoding="utf-8") as f:
+        json.dump(all_elements, f, ensure_ascii=False, indent=4)
+    if lazy_crops != saved_lazy:
+        save_raw_detections(detections_path, all_dets, scale, lazy_crops)
+    record_document(session, out_dir, all_elements, markdown=False)
+    logger.success(f"✓ Re-stitched {stem} ({len(all_elements)} elements)")
+    return all_elements
+
+
+# ----------------------------------------------------------------------
+# Catalog of processed documents
+# ----------------------------------------------------------------------
+def summarize_elements(elements: List[Dict]) -> Dict[str, Any]:
+    """Catalog fields for a document's elements: counts plus figure/table image paths and pages."""
+    figures = [
+        {"image_path": e["image_path"], "page": e.get("page")}
+        for e in elements if e.get("type") == "figure"
+    ]
+    tables = [
+        {"image_path": e["image_path"], "page": e.get("page")}
+        for e in elements if e.get("type") == "table"
+    ]
+    return {
+        "figures_count": len(figures),
+        "tables_count": len(tables),
+        "elements_count": len(elements),
+        "figures": figures,
+        "tables": tables,
+    }
+
+
+class OutputCatalog:
+    """
+    Index of the document folders under one output root, in SQLite, so listings and
+    details don't scan directories or parse content lists. Every write is a single
+    transaction; paths are relative to the document folder.
+    """
+
+    _JSON_COLUMNS = ("filenames", "figures", "tables")
+    _COLUMNS = (
+        "stem", "name", "filenames", "sha256", "page_count", "figures_count",
+        "tables_count", "elements_count", "figures", "tables", "markdown_path",
+        "annotated_pdf", "pdf_path", "created", "updated",
+    )
+    SORT_COLUMNS = {
+        "name": "name COLLATE NOCASE",
+        "updated": "updated",
+        "created": "created",
+        "pages": "page_count",
+        "figures": "figures_count",
+        "tables": "tables_count",
+        "elements": "elements_count",
+    }
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " stem TEXT PRIMARY KEY, name TEXT NOT NULL,"
+                " filenames TEXT NOT NULL DEFAULT '[]', sha256 TEXT, page_count INTEGER,"
+                " figures_count INTEGER NOT NULL DEFAULT 0,"
+                " tables_count INTEGER NOT NULL DEFAULT 0,"
+                " elements_count INTEGER NOT NULL DEFAULT 0,"
+                " figures TEXT NOT NULL DEFAULT '[]', tables TEXT NOT NULL DEFAULT '[]',"
+                " markdown_path TEXT, annotated_pdf TEXT, pdf_path TEXT,"
+                " created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "pdf_path" not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN pdf_path TEXT")
+            for column in ("name", "updated", "figures_count", "tables_count"):
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS documents_{column} ON documents ({column})"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _row(self, row: Sequence[Any]) -> Dict[str, Any]:
+        doc = dict(zip(self._COLUMNS, row))
+        for column in self._JSON_COLUMNS:
+            doc[column] = json.loads(doc[column])
+        return doc
+
+    @staticmethod
+    def _ensure(conn: sqlite3.Connection, stem: str, now: float):
+        conn.execute(
+            "INSERT OR IGNORE INTO documents (stem, name, created, updated) VALUES (?, ?, ?, ?)",
+            (stem, stem, now, now),
+        )
+
+    def upsert(self, stem: str, **fields: Any):
+        """Create or update a document's row; only the given columns change."""
+        unknown = set(fields) - set(self._COLUMNS[1:])
+        if unknown:
+            raise ValueError(f"Unknown catalog columns: {sorted(unknown)}")
+        now = time.time()
+        values = {
+            key: json.dumps(value) if key in self._JSON_COLUMNS else value
+            for key, value in fields.items()
+        }
+        values.setdefault("updated", now)
+        assignments = ", ".join(f"{key} = ?" for key in values)
+        with self._connect() as conn:
+            self._ensure(conn, stem, now)
+            conn.execute(
+                f"UPDATE documents SET {assignments} WHERE stem = ?",
+                [*values.values(), stem],
+            )
+
+    def add_filename(self, stem: str, filename: str, sha256: Optional[str] = None):
+        """Record a name the document was uploaded under; the first one names it."""
+        now = time.time()
+        with self._connect() as conn:
+            self._ensure(conn, stem, now)
+            (filenames,) = conn.execute(
+                "SELECT filenames FROM documents WHERE stem = ?", (stem,)
+            ).fetchone()
+            filenames = json.loads(filenames)
+            if filename in filenames:
+                return
+            filenames.append(filename)
+            conn.execute(
+                "UPDATE documents SET filenames = ?, name = ?, sha256 = COALESCE(?, sha256)"
+                " WHERE stem = ?",
+                (json.dumps(filenames), Path(filenames[0]).stem, sha256, stem),
+            )
+
+    def delete(self, stem: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM documents WHERE stem = ?", (stem,)).rowcount > 0
+
+    def get(self, stem: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM documents WHERE stem = ?", (stem,)
+            ).fetchone()
+        return self._row(row) if row is not None else None
+
+    def list(
+        self, offset: int = 0, limit: int = 100, sort: str = "updated", descending: bool = True
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of documents without their figure/table lists, plus the total count."""
+        if sort not in self.SORT_COLUMNS:
+            raise ValueError(f"Unknown sort key {sort!r}; use one of {sorted(self.SORT_COLUMNS)}")
+        order = f"{self.SORT_COLUMNS[sort]} {'DESC' if descending else 'ASC'}, stem"
+        columns = [c for c in self._COLUMNS if c not in ("figures", "tables")]
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM documents ORDER BY {order} LIMIT ? OFFSET ?",
+                (max(0, limit), max(0, offset)),
+            ).fetchall()
+        docs = []
+        for row in rows:
+            doc = dict(zip(columns, row))
+            doc["filenames"] = json.loads(doc["filenames"])
+            docs.append(doc)
+        return docs, total
+
+    def sync(self, output_root: Path):
+        """
+        Index document folders written before the catalog existed (or by hand) and
+        drop rows whose folder is gone. One directory scan; run at startup.
+        """
+        with self._connect() as conn:
+            known = {stem for (stem,) in conn.execute("SELECT stem FROM documents")}
+        present = set()
+        for out_dir in Path(output_root).iterdir():
+            if not out_dir.is_dir():
+                continue
+            present.add(out_dir.name)
+            if out_dir.name not in known:
+                fields = scan_output_dir(out_dir)
+                if fields is not None:
+                    self.upsert(out_dir.name, **fields)
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM documents WHERE stem = ?", [(stem,) for stem in known - present]
+            )
+
+
+def scan_output_dir(out_dir: Path) -> Optional[Dict[str, Any]]:
+    """Catalog fields of an existing document folder, or None if it holds no outputs."""
+    content_lists = list(out_dir.glob("*_content_list.json"))
+    md_files = list(out_dir.glob("*.md"))
+    pdf_files = list(out_dir.glob("*.pdf"))
+    if not (content_lists or md_files or pdf_files):
+        return None
+    fields: Dict[str, Any] = {}
+    if content_lists:
+        elements = json.loads(content_lists[0].read_text(encoding="utf-8"))
+        fields.update(summarize_elements(elements))
+    if md_files:
+        fields["markdown_path"] = md_files[0].name
+    detections = list(out_dir.glob("*_detections.json"))
+    if detections:
+        stem = detections[0].name[: -len("_detections.json")]
+        fields["annotated_pdf"] = layout_pdf_name(stem)
+    fields["updated"] = out_dir.stat().st_mtime
+    return fields
+
+
+def get_output_catalog(output_root: Path) -> Optional[OutputCatalog]:
+    """Catalog of an output root for this process, or None when disabled or unavailable."""
+    if not USE_OUTPUT_CATALOG:
+        return None
+    root = Path(output_root).resolve()
+    with _output_catalogs_lock:
+        catalog = _output_catalogs.get(root)
+        if catalog is None:
+            try:
+                catalog = OutputCatalog(root / OUTPUT_CATALOG_NAME)
+            except Exception as exc:
+                logger.warning(f"Output catalog unavailable ({exc}); running without it")
+                return None
+            _output_catalogs[root] = catalog
+        return catalog
+
+
+def record_document(
+    session: DocumentSession,
+    out_dir: Path,
+    elements: Optional[List[Dict]],
+    markdown: bool,
+):
+    """
+    Record a finished document in its output root's catalog. `elements` is None when
+    images were not extracted, so counts from an earlier run are kept.
+    """
+    catalog = get_output_catalog(out_dir.parent)
+    if catalog is None:
+        return
+    stem = session.path.stem
+    fields: Dict[str, Any] = {
+        "page_count": session.page_count,
+        "pdf_path": str(session.path.resolve()),
+    }
+    if elements is not None:
+        fields.update(summarize_elements(elements))
+        # Built on first request from the detections (build_layout_pdf) when not drawn yet
+        has_detections = (out_dir / f"{stem}_detections.json").exists()
+        fields["annotated_pdf"] = layout_pdf_name(stem) if has_detections else None
+    if markdown:
+        md_path = out_dir / f"{stem}.md"
+        fields["markdown_path"] = md_path.name if md_path.exists() else None
+    try:
+        catalog.upsert(out_dir.name, **fields)
+    except Exception as exc:
+        logger.warning(f"  Could not update the output catalog for {stem}: {exc}")
+
+
+# ----------------------------------------------------------------------
+# Process many PDFs through one global page queue
+# ----------------------------------------------------------------------
+def _page_chunk_size(total_pages: int, pool: Pool) -> int:
+    """Spread pages over all workers, but never exceed the model batch size."""
+    pool_size = getattr(pool, "_processes", None) or cpu_count()
+    return max(1, min(get_detect_batch_size(), -(-total_pages // pool_size)))
+
+
+def _page_batches(page_count: int, chunk_size: int) -> List[List[int]]:
+    return [
+        list(range(start, min(start + chunk_size, page_count)))
+        for start in range(0, page_count, chunk_size)
+    ]
+
+
+def _process_scheduled_batch(
+    scheduled: Tuple[
+        int, Tuple[List[int], Path, Tuple[str, int, int], Optional[str], float, Path, str, bool]
+    ]
+) -> Tuple[int, int, List[Tuple[int, PageDetections, List[dict], Dict[str, dict]]]]:
+    """Run a page batch and tag the result with its document slot and page count."""
+    doc_slot, task_data = scheduled
+    return doc_slot, len(task_data[0]), process_page_batch(task_data)
+
+
+def process_pdfs_with_pool(
+    pdf_paths: Sequence[Path],
+    output_root: Path,
+    pool: Pool,
+    *,
+    extract_markdown: bool = True,
+    lazy_crops: bool = False,
+):
+    """
+    Process many PDFs through one global page queue.
+    Page batches from all documents share the pool and stream back unordered;
+    each document is finalized as soon as its last page batch returns.
+    Documents are only counted up front; a document's session is opened when its
+    batches are dispatched, and at most MAX_OPEN_DOCUMENTS are open at once.
+    """
+    scale = LAYOUT_SCALE
+    docs: List[Dict[str, Any]] = []
+
+    for pdf_path in pdf_paths:
+        doc = None
+        try:
+            with _PDFIUM_LOCK:
+                doc = pdfium.PdfDocument(str(pdf_path))
+                page_count = len(doc)
+        except Exception as e:
+            logger.error(f"Failed to open PDF {pdf_path.name}: {e}. Skipping.")
+            continue
+        finally:
+            if doc is not None:
+                with _PDFIUM_LOCK:
+                    doc.close()
+
+        out_dir = output_root / pdf_path.stem
+        os.makedirs(out_dir, exist_ok=True)
+        docs.append({
+            "session": None,
+            "pdf_path": pdf_path,
+            "out_dir": out_dir,
+            "doc_key": document_key(pdf_path),
+            "pdf_hash": None,
+            "all_dets": [None] * page_count,
+            "all_elements": [],
+            "remaining": page_count,
+            "markdown": None,
+        })
+
+    total_pages = sum(len(doc["all_dets"]) for doc in docs)
+    if not docs:
+        return
+    chunk_size = _page_chunk_size(total_pages, pool) if total_pages else 1
+    logger.info(
+        f"Scheduling {total_pages} pages from {len(docs)} PDF(s) "
+        f"in batches of up to {chunk_size} pages"
+    )
+    open_slots = threading.BoundedSemaphore(MAX_OPEN_DOCUMENTS)
+    stop = threading.Event()
+
+    def scheduled_tasks():
+        # Runs on the pool's task feeder thread, which waits here for a free slot
+        # while the main thread finalizes (and closes) earlier documents
+        for doc_slot, doc in enumerate(docs):
+            if not doc["all_dets"]:
+                continue
+            while not open_slots.acquire(timeout=0.5):
+                if stop.is_set() or _shutdown_requested:
+                    return
+            if _shutdown_requested or not _open_scheduled_document(doc, extract_markdown):
+                open_slots.release()
+                if _shutdown_requested:
+                    return
+                continue
+            for page_numbers in _page_batches(len(doc["all_dets"]), chunk_size):
+                yield doc_slot, (
+                    page_numbers,
+                    doc["pdf_path"],
+                    doc["doc_key"],
+                    doc["pdf_hash"],
+                    scale,
+                    doc["out_dir"],
+                    doc["pdf_path"].name,
+                    lazy_crops,
+                )
+
+    # One crop store for all documents keeps the in-memory budget global
+    crops = CropStore()
+    try:
+        _run_scheduled_documents(
+            docs, scheduled_tasks(), pool, crops, scale, extract_markdown, lazy_crops,
+            open_slots,
+        )
+    finally:
+        stop.set()
+        crops.close()
+        for doc in docs:
+            _close_scheduled_document(doc)
+
+
+def _open_scheduled_document(doc: Dict[str, Any], extract_markdown: bool) -> bool:
+    """Open a scheduled document's session (and start its markdown); False if it can't be."""
+    try:
+        session = DocumentSession(doc["pdf_path"])
+    except Exception as e:
+        logger.error(f"Failed to open PDF {doc['pdf_path'].name}: {e}. Skipping.")
+        doc["remaining"] = 0
+        return False
+    doc["session"] = session
+    doc["pdf_hash"] = session.sha256 if USE_DETECTION_CACHE else None
+    if extract_markdown and not markdown_from_detections(True):
+        doc["markdown"] = submit_markdown(session, doc["out_dir"])
+    return True
+
+
+def _close_scheduled_document(doc: Dict[str, Any]):
+    session = doc.get("session")
+    if session is not None:
+        session.close()
+        doc["session"] = None
+
+
+def _run_scheduled_documents(
+    docs: List[Dict[str, Any]],
+    tasks: Iterable,
+    pool: Pool,
+    crops: CropStore,
+    scale: float,
+    extract_markdown: bool,
+    lazy_crops: bool,
+    open_slots: threading.BoundedSemaphore,
+):
+    """
+    Collect scheduled page batches and finalize each document when complete,
+    closing its session and freeing its slot in `open_slots`.
+    """
+    # Documents without pages have nothing to wait for
+    finished = 0
+    for doc in docs:
+        if doc["all_dets"]:
+            continue
+        with open_slots:
+            if _open_scheduled_document(doc, extract_markdown):
+                try:
+                    finalize_document(
+                        doc["session"], doc["out_dir"], doc["all_dets"], doc["all_elements"],
+                        scale, crops, extract_markdown=extract_markdown, lazy_crops=lazy_crops,
+                        markdown_job=doc["markdown"],
+                    )
+                finally:
+                    _close_scheduled_document(doc)
+        finished += 1
+
+    for doc_slot, batch_pages, batch_results in pool.imap_unordered(
+        _process_scheduled_batch, tasks
+    ):
+        doc = docs[doc_slot]
+        for pno, dets, elements, _ in batch_results:
+            doc["all_dets"][pno] = dets
+            crops.adopt(elements)
+            doc["all_elements"].extend(elements)
+
+        doc["remaining"] -= batch_pages
+        if doc["remaining"] > 0:
+            continue
+
+        finished += 1
+        logger.info(f"📄 [{finished}/{len(docs)}] Finalizing {doc['pdf_path'].name}")
+        # Elements arrive out of order; keep the per-page order of the serial path
+        doc["all_elements"].sort(key=lambda elem: elem.get("page", 0))
+        try:
+            finalize_document(
+                doc["session"], doc["out_dir"], doc["all_dets"], doc["all_elements"],
+                scale, crops, extract_markdown=extract_markdown, lazy_crops=lazy_crops,
+                markdown_job=doc["markdown"],
+            )
+        except Exception as e:
+            logger.error(f"Error finalizing {doc['pdf_path'].name}: {e}")
+        finally:
+            _close_scheduled_document(doc)
+            open_slots.release()
+        # Release per-document state as soon as it has been written out
+        for elem in doc["all_elements"]:
+            if "_crop" in elem:
+                crops.discard(elem.pop("_crop"))
+        doc["all_dets"] = []
+        doc["all_elements"] = []
+
+    if _shutdown_requested:
+        logger.warning(f"\nShutdown requested. Finalized {finished}/{len(docs)} files.")
+
 # ----------------------------------------------------------------------
 # Main
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract figures, tables and markdown from PDFs in ./pdfs")
+    parser.add_argument(
+        "--restitch",
+        action="store_true",
+        help="Only re-run stitching from the detections saved by a previous run (no model pass)",
+    )
+    parser.add_argument(
+        "--thresholds",
+        type=Path,
+        help='JSON file with "table_stitch", "cross_page_caption" and/or "title_text" overrides',
+    )
+    parser.add_argument(
+        "--layout-pdf",
+        nargs="?",
+        const="",
+        metavar="PAGES",
+        help="Only build annotated layout PDFs from saved detections, optionally of a page range (3-7)",
+    )
+    parser.add_argument(
+        "--metadata-only",
+        action="store_true",
+        default=LAZY_CROPS,
+        help="Only write figure/table boxes; crops are rendered when first requested",
+    )
+    args = parser.parse_args()
+
     # Important for multiprocessing on Windows/macOS
     torch.multiprocessing.set_start_method('spawn', force=True)
     
@@ -1230,6 +3909,41 @@ if __name__ == "__main__":
         sys.exit(0)
 
     logger.info(f"Found {len(pdf_files)} PDF file(s) to process")
+
+    if args.restitch:
+        overrides = {}
+        if args.thresholds:
+            overrides = json.loads(args.thresholds.read_text(encoding="utf-8"))
+        for pdf_path in pdf_files:
+            try:
+                restitch_document(
+                    pdf_path,
+                    OUTPUT_DIR / pdf_path.stem,
+                    table_tolerances=overrides.get("table_stitch"),
+                    caption_thresholds=overrides.get("cross_page_caption"),
+                    title_text_settings=overrides.get("title_text"),
+                    # Without the flag each document keeps the mode it was processed in
+                    lazy_crops=True if args.metadata_only else None,
+                )
+            except Exception as e:
+                logger.error(f"Error re-stitching {pdf_path.name}: {e}")
+        sys.exit(0)
+
+    if args.layout_pdf is not None:
+        for pdf_path in pdf_files:
+            try:
+                layout_path = build_layout_pdf(
+                    OUTPUT_DIR / pdf_path.stem, args.layout_pdf or None
+                )
+                if layout_path is None:
+                    logger.error(
+                        f"No persisted detections for {pdf_path.stem}; run full processing first."
+                    )
+                else:
+                    logger.success(f"✓ {layout_path}")
+            except Exception as e:
+                logger.error(f"Error building the layout PDF of {pdf_path.name}: {e}")
+        sys.exit(0)
     logger.info(f"Settings: MODEL_SIZE={MODEL_SIZE}, CONF={CONF_THRESHOLD}")
     
     # Determine worker count
@@ -1264,30 +3978,41 @@ if __name__ == "__main__":
             get_model()
             logger.success(f"✓ Model loaded (device: {DEVICE})\n")
 
-        # Process all PDFs using the same pool
-        for i, pdf_path in enumerate(pdf_files, 1):
-            if _shutdown_requested:
-                logger.warning(f"\nShutdown requested. Processed {i-1}/{len(pdf_files)} files.")
-                break
-            
-            logger.info(f"\n{'='*60}")
-            logger.info(f"📄 File {i}/{len(pdf_files)}: {pdf_path.name}")
-            logger.info(f"{'='*60}")
-            
-            sub_out = OUTPUT_DIR / pdf_path.stem
-            os.makedirs(sub_out, exist_ok=True)
-            
+        if pool is not None:
+            # Pages of all PDFs share one global queue on the pool
             try:
-                process_pdf_with_pool(pdf_path, sub_out, pool)
+                process_pdfs_with_pool(
+                    pdf_files, OUTPUT_DIR, pool, lazy_crops=args.metadata_only
+                )
             except KeyboardInterrupt:
-                logger.warning(f"\nInterrupted while processing {pdf_path.name}")
-                break
-            except Exception as e:
-                logger.error(f"Error processing {pdf_path.name}: {e}")
+                logger.warning("\nInterrupted while processing the batch")
+        else:
+            # Serial execution: one PDF at a time
+            for i, pdf_path in enumerate(pdf_files, 1):
                 if _shutdown_requested:
+                    logger.warning(f"\nShutdown requested. Processed {i-1}/{len(pdf_files)} files.")
                     break
-                logger.info("Continuing with next file...")
-                continue
+            
+                logger.info(f"\n{'='*60}")
+                logger.info(f"📄 File {i}/{len(pdf_files)}: {pdf_path.name}")
+                logger.info(f"{'='*60}")
+            
+                sub_out = OUTPUT_DIR / pdf_path.stem
+                os.makedirs(sub_out, exist_ok=True)
+            
+                try:
+                    process_pdf_with_pool(
+                        pdf_path, sub_out, pool, lazy_crops=args.metadata_only
+                    )
+                except KeyboardInterrupt:
+                    logger.warning(f"\nInterrupted while processing {pdf_path.name}")
+                    break
+                except Exception as e:
+                    logger.error(f"Error processing {pdf_path.name}: {e}")
+                    if _shutdown_requested:
+                        break
+                    logger.info("Continuing with next file...")
+                    continue
 
         if _shutdown_requested:
             logger.warning(f"\n⚠️  Processing interrupted. Partial results saved in {OUTPUT_DIR}")
@@ -42,7 +42,8 @@ if __name__ == '__main__':
     print("\nStarting PDF Layout Extractor Flask App...")
     print("Open your browser to http://localhost:5000\n")
     
-    from app import app
+    from app import app, start_cpu_pool
+    start_cpu_pool()
     # Disable reloader to avoid environment discrepancies in child process
     app.run(debug=False, use_reloader=False, host='0.0.0.0', port=5000)
 
@@ -2,6 +2,8 @@
 const AppState = {
     currentPdf: null,
     pdfs: [],
+    pdfTotal: 0,
+    pdfPage: 0,
     deviceInfo: null,
 };
 
@@ -106,22 +108,27 @@ async function handleUpload(e) {
             throw new Error(data.error);
         }
         
+        // Reset form; processing continues on the server
+        fileInput.value = '';
+        
+        const jobs = await waitForJobs(data.jobs || []);
+        
         // Hide processing section
         document.getElementById('processingSection').style.display = 'none';
         
         // Reload PDF list and show results
         await loadPdfList();
         
-        // Show first PDF details if available
-        if (data.results && data.results.length > 0) {
-            const firstPdf = data.results[0];
-            if (!firstPdf.error) {
-                showPdfDetails(firstPdf.stem);
-            }
+        const failed = jobs.filter(job => job.status === 'failed');
+        if (failed.length > 0) {
+            alert('Error processing files:\n' + failed.map(job => `${job.filename}: ${job.error}`).join('\n'));
         }
         
-        // Reset form
-        fileInput.value = '';
+        // Show first PDF details if available
+        const firstDone = jobs.find(job => job.status === 'done');
+        if (firstDone) {
+            showPdfDetails(firstDone.stem);
+        }
         
     } catch (error) {
         console.error('Upload error:', error);
@@ -130,12 +137,93 @@ async function handleUpload(e) {
     }
 }
 
-// Load PDF List
+// Follow queued jobs until every one has finished
+async function waitForJobs(jobs) {
+    const status = document.getElementById('processingStatus');
+    const progress = {};
+    
+    const render = () => {
+        const finished = jobs.filter(job => job.status === 'done' || job.status === 'failed').length;
+        const lines = jobs
+            .filter(job => progress[job.job_id])
+            .map(job => `${job.filename}: ${progress[job.job_id]}`);
+        status.textContent = `${finished}/${jobs.length} done` + (lines.length ? ' - ' + lines.join(' | ') : '');
+    };
+    render();
+    
+    const results = await Promise.all(jobs.map(async (job, index) => {
+        if (!job.job_id || job.status === 'done' || job.status === 'failed') {
+            return job;
+        }
+        const onEvent = (event) => {
+            progress[job.job_id] = describeJobEvent(event);
+            render();
+        };
+        const result = window.EventSource ? await followJobEvents(job, onEvent) : await pollJob(job);
+        jobs[index] = result;
+        delete progress[job.job_id];
+        render();
+        return result;
+    }));
+    
+    status.textContent = 'Please wait';
+    return results;
+}
+
+// Stream a job's progress events (SSE); falls back to polling if the stream drops
+function followJobEvents(job, onEvent) {
+    return new Promise(resolve => {
+        const source = new EventSource(`/api/jobs/${job.job_id}/events`);
+        const names = ['running', 'started', 'page_rendered', 'page_detected', 'page_saved',
+                       'markdown_page', 'stage', 'finished'];
+        names.forEach(name => source.addEventListener(name, e => onEvent(JSON.parse(e.data))));
+        ['done', 'failed'].forEach(name => source.addEventListener(name, e => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        }));
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) {
+                pollJob(job).then(resolve);
+            }
+        };
+    });
+}
+
+function describeJobEvent(event) {
+    const page = event.page && event.pages ? `page ${event.page}/${event.pages}` : (event.page ? `page ${event.page}` : '');
+    switch (event.event) {
+        case 'waiting': return 'waiting for the running job on this PDF';
+        case 'running': return 'starting';
+        case 'started': return `${event.pages} pages`;
+        case 'page_rendered': return `rendered ${page}`;
+        case 'page_detected': return `detected ${event.detections} regions on ${page}`;
+        case 'page_saved': return `${page}: ${event.figures} figures, ${event.tables} tables`;
+        case 'markdown_page': return `markdown ${page}`;
+        case 'stage': return `${event.stage} done in ${event.seconds}s`;
+        case 'finished': return `finished in ${event.seconds}s`;
+        default: return event.event;
+    }
+}
+
+// Poll a job until it has finished
+async function pollJob(job, intervalMs = 1000) {
+    let current = job;
+    while (current.status === 'queued' || current.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        const response = await fetch(`/api/jobs/${job.job_id}`);
+        current = response.ok ? await response.json() : { ...job, status: 'failed', error: 'Job not found' };
+    }
+    return current;
+}
+
+// Load PDF List (first page; further pages are appended by loadMorePdfs)
 async function loadPdfList() {
     try {
-        const response = await fetch('/api/pdf-list');
+        const response = await fetch('/api/pdf-list?page=1');
         const data = await response.json();
         AppState.pdfs = data.pdfs || [];
+        AppState.pdfTotal = data.total ?? AppState.pdfs.length;
+        AppState.pdfPage = data.page || 1;
         renderPdfList();
         
         if (AppState.pdfs.length > 0) {
@@ -150,6 +238,23 @@ async function loadPdfList() {
     }
 }
 
+// Append the next page of the PDF list
+async function loadMorePdfs(button) {
+    button.disabled = true;
+    try {
+        const response = await fetch(`/api/pdf-list?page=${AppState.pdfPage + 1}`);
+        const data = await response.json();
+        const known = new Set(AppState.pdfs.map(pdf => pdf.stem));
+        AppState.pdfs.push(...(data.pdfs || []).filter(pdf => !known.has(pdf.stem)));
+        AppState.pdfTotal = data.total ?? AppState.pdfTotal;
+        AppState.pdfPage = data.page || AppState.pdfPage + 1;
+        renderPdfList();
+    } catch (error) {
+        console.error('Error loading more PDFs:', error);
+        button.disabled = false;
+    }
+}
+
 // Render PDF List
 function renderPdfList() {
     const pdfList = document.getElementById('pdfList');
@@ -171,7 +276,7 @@ function renderPdfList() {
             <div class="d-flex w-100 justify-content-between">
                 <h6 class="mb-0">
                     <i class="fas fa-file-pdf me-2"></i>
-                    ${pdf.stem}
+                    ${pdf.name || pdf.stem}
                 </h6>
             </div>
         `;
@@ -186,11 +291,11 @@ function renderPdfList() {
         const delBtn = document.createElement('button');
         delBtn.className = 'btn btn-sm btn-outline-danger ms-3';
         delBtn.innerHTML = '<i class="fas fa-trash-alt"></i>';
-        delBtn.title = `Delete "${pdf.stem}"`;
+        delBtn.title = `Delete "${pdf.name || pdf.stem}"`;
         delBtn.addEventListener('click', async (e) => {
             e.preventDefault();
             e.stopPropagation();
-            const confirmed = confirm(`Delete processed outputs for "${pdf.stem}"? This cannot be undone.`);
+            const confirmed = confirm(`Delete processed outputs for "${pdf.name || pdf.stem}"? This cannot be undone.`);
             if (!confirmed) return;
             try {
                 // Use form-encoded POST to the body endpoint for widest compatibility
@@ -213,7 +318,7 @@ function renderPdfList() {
                         details.innerHTML = `
                             <div class="alert alert-success">
                                 <i class="fas fa-check-circle me-2"></i>
-                                Deleted "${pdf.stem}" successfully.
+                                Deleted "${pdf.name || pdf.stem}" successfully.
                             </div>
                         `;
                     }
@@ -229,6 +334,16 @@ function renderPdfList() {
         item.appendChild(delBtn);
         pdfList.appendChild(item);
     });
+
+    const remaining = AppState.pdfTotal - AppState.pdfs.length;
+    if (remaining > 0) {
+        const moreBtn = document.createElement('button');
+        moreBtn.type = 'button';
+        moreBtn.className = 'btn btn-sm btn-outline-secondary w-100 mt-2';
+        moreBtn.innerHTML = `<i class="fas fa-chevron-down me-2"></i>Load more (${remaining} remaining)`;
+        moreBtn.addEventListener('click', () => loadMorePdfs(moreBtn));
+        pdfList.appendChild(moreBtn);
+    }
 }
 
 // Show PDF Details
@@ -273,7 +388,7 @@ function renderPdfDetails(data) {
             <div class="card-header bg-primary-custom text-white">
                 <h5 class="mb-0">
                     <i class="fas fa-file-pdf me-2"></i>
-                    ${data.stem}
+                    ${data.name || data.stem}
                 </h5>
                 <button class="btn btn-sm btn-danger float-end" id="deletePdfBtn" title="Delete this processed PDF">
                     <i class="fas fa-trash-alt me-1"></i> Delete
@@ -354,9 +469,12 @@ function renderPdfDetails(data) {
         
         data.figure_images.forEach((imgPath, index) => {
             const figure = data.figures[index] || {};
+            const thumbnail = (data.figure_thumbnails || [])[index] || {};
             html += `
                 <div class="image-item">
-                    <img src="/output/${imgPath}" alt="Figure ${index + 1}" loading="lazy">
+                    <a href="/output/${imgPath}" target="_blank" rel="noopener">
+                        <img src="/output/${thumbnail.medium || imgPath}" alt="Figure ${index + 1}" loading="lazy">
+                    </a>
                     <div class="image-caption">
                         <strong>Figure ${index + 1}</strong>
                         ${figure.page ? `<br><small class="text-muted">Page ${figure.page}</small>` : ''}
@@ -388,9 +506,12 @@ function renderPdfDetails(data) {
         
         data.table_images.forEach((imgPath, index) => {
             const table = data.tables[index] || {};
+            const thumbnail = (data.table_thumbnails || [])[index] || {};
             html += `
                 <div class="image-item">
-                    <img src="/output/${imgPath}" alt="Table ${index + 1}" loading="lazy">
+                    <a href="/output/${imgPath}" target="_blank" rel="noopener">
+                        <img src="/output/${thumbnail.medium || imgPath}" alt="Table ${index + 1}" loading="lazy">
+                    </a>
                     <div class="image-caption">
                         <strong>Table ${index + 1}</strong>
                         ${table.page ? `<br><small class="text-muted">Page ${table.page}</small>` : ''}
@@ -436,7 +557,7 @@ function renderPdfDetails(data) {
     const deleteBtn = document.getElementById('deletePdfBtn');
     if (deleteBtn) {
         deleteBtn.addEventListener('click', async () => {
-            const confirmed = confirm(`Delete processed outputs for "${data.stem}"? This cannot be undone.`);
+            const confirmed = confirm(`Delete processed outputs for "${data.name || data.stem}"? This cannot be undone.`);
             if (!confirmed) return;
             try {
                 // Use form-encoded POST to the body endpoint for widest compatibility
@@ -456,7 +577,7 @@ function renderPdfDetails(data) {
                 document.getElementById('pdfDetails').innerHTML = `
                     <div class="alert alert-success">
                         <i class="fas fa-check-circle me-2"></i>
-                        Deleted "${data.stem}" successfully.
+                        Deleted "${data.name || data.stem}" successfully.
                     </div>
                 `;
                 AppState.currentPdf = null;
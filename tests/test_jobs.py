@@ -0,0 +1,115 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import app as webapp
+
+
+class FakeExtraction:
+    """Stands in for main.process_pdf_with_pool: writes the requested outputs, optionally
+    blocking the first call, and records how many run on one document at once."""
+
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self.first_started = threading.Event()
+        self.release_first = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, pdf_path, out_dir, pool=None, extract_images=True,
+                 extract_markdown=False, lazy_crops=False, progress=None):
+        with self._lock:
+            self.calls.append((extract_images, extract_markdown))
+            first = len(self.calls) == 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if first:
+                self.first_started.set()
+                self.release_first.wait(10)
+            if extract_images:
+                (out_dir / f"{pdf_path.stem}_detections.json").write_text("{}")
+            if extract_markdown:
+                (out_dir / f"{pdf_path.stem}.md").write_text("# doc")
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def wait_finished(job, timeout=10.0):
+    deadline = time.time() + timeout
+    while not job.is_finished and time.time() < deadline:
+        time.sleep(0.01)
+    return job.is_finished
+
+
+class SubmitJobTests(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.output_dir = self.root / "doc"
+        self.output_dir.mkdir()
+        self.pdf_path = self.output_dir / "doc.pdf"
+        self.pdf_path.write_bytes(b"%PDF-1.4")
+        self.extraction = FakeExtraction()
+        patches = [
+            mock.patch.dict(webapp.app.config, {'OUTPUT_FOLDER': str(self.root), 'JOB_WORKERS': 4}),
+            mock.patch.object(webapp.extractor, 'process_pdf_with_pool', self.extraction),
+            mock.patch.object(webapp, 'start_cpu_pool', return_value=None),
+            mock.patch.object(webapp, 'load_model_once'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.addCleanup(webapp.shutdown_workers)
+
+    def job(self, include_images, include_markdown):
+        return webapp.ProcessingJob(
+            "doc.pdf", self.pdf_path, self.output_dir, include_images, include_markdown
+        )
+
+    def test_wider_job_waits_for_running_narrow_job(self):
+        narrow = webapp.submit_job(self.job(True, False))
+        self.assertTrue(self.extraction.first_started.wait(10))
+
+        wide = webapp.submit_job(self.job(True, True))
+        self.assertIsNot(wide, narrow)
+        # A third upload is covered by the queued wide job instead of piling on
+        self.assertIs(webapp.submit_job(self.job(True, False)), wide)
+
+        time.sleep(0.2)
+        self.assertEqual(self.extraction.calls, [(True, False)])
+        self.assertEqual(wide.status, 'queued')
+
+        self.extraction.release_first.set()
+        self.assertTrue(wait_finished(narrow))
+        self.assertTrue(wait_finished(wide))
+
+        self.assertEqual(self.extraction.calls, [(True, False), (True, True)])
+        self.assertEqual(self.extraction.max_running, 1)
+        self.assertEqual((narrow.status, wide.status), ('done', 'done'))
+        self.assertTrue(wide.result['include_markdown'])
+        self.assertNotIn("doc", webapp._active_jobs)
+
+    def test_queued_job_covered_by_earlier_run_finishes_as_cached(self):
+        markdown = webapp.submit_job(self.job(False, True))
+        self.assertTrue(self.extraction.first_started.wait(10))
+        images = webapp.submit_job(self.job(True, False))
+        # The running job wrote what the queued one asks for meanwhile
+        (self.output_dir / "doc_detections.json").write_text("{}")
+
+        self.extraction.release_first.set()
+        self.assertTrue(wait_finished(markdown))
+        self.assertTrue(wait_finished(images))
+        self.assertEqual(self.extraction.calls, [(False, True)])
+        self.assertTrue(images.cached)
+        self.assertNotIn("doc", webapp._active_jobs)
+
+
+if __name__ == '__main__':
+    unittest.main()
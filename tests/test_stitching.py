@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import fitz
+
+import main
+
+
+def detections(*dets):
+    return main.PageDetections.from_dicts(
+        [{"name": name, "conf": 0.9, "bbox": bbox} for name, bbox in dets]
+    )
+
+
+class CrossPageCaptionTests(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.pdf_path = self.root / "doc.pdf"
+        doc = fitz.open()
+        figure_page = doc.new_page(width=612, height=792)
+        figure_page.draw_rect(fitz.Rect(50, 50, 550, 350), color=(0, 0, 0), fill=(0.2, 0.4, 0.8))
+        caption_page = doc.new_page(width=612, height=792)
+        caption_page.insert_text((60, 40), "Figure 1: a caption continued on the next page", fontsize=11)
+        doc.save(str(self.pdf_path))
+        doc.close()
+
+    def test_caption_on_next_page_is_rendered_at_crop_scale(self):
+        scale = main.LAYOUT_SCALE
+        all_dets = [
+            detections(("figure", [100, 100, 1100, 700])),
+            detections(("figure_caption", [100, 40, 1100, 100])),
+        ]
+        crops = main.CropStore()
+        try:
+            with main.DocumentSession(self.pdf_path) as session:
+                page = session.page(0)
+                elements = main.save_layout_elements(page, 0, all_dets[0], self.root, scale=scale)
+                page.close()
+                crops.adopt(elements)
+                figure = next(elem for elem in elements if elem["type"] == "figure")
+                width, height = crops.get(figure["_crop"]).size
+
+                with mock.patch.object(main, "render_region", wraps=main.render_region) as render:
+                    main.attach_cross_page_figure_captions(elements, all_dets, session, crops, scale)
+
+                stitched = crops.get(figure["_crop"])
+        finally:
+            crops.close()
+
+        # The caption is a clipped render of the next page at CROP_SCALE: 500 x 30 pt
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(render.call_args.args[1], [100, 40, 1100, 100])
+        caption_size = (int(500 * main.CROP_SCALE), int(30 * main.CROP_SCALE))
+        self.assertEqual(width, caption_size[0])
+        self.assertEqual(stitched.size, (width, height + caption_size[1]))
+        self.assertEqual(figure["captions"][0]["page"], 2)
+        self.assertEqual([region["page"] for region in figure["regions"]], [1, 2])
+
+
+class SettledCropTests(unittest.TestCase):
+    def element(self, kind, page, bbox):
+        return {"type": kind, "page": page, "bbox_pixels": bbox, "image_path": f"{kind}s/p{page}.png"}
+
+    def test_only_crops_stitching_may_change_stay_in_memory(self):
+        # A pool batch of pages 1-3 (0-based 0-2) of a 6-page document
+        dets_by_page = {
+            0: detections(("figure", [100, 400, 1100, 900])),
+            1: detections(("figure_caption", [100, 40, 1100, 90]), ("figure", [100, 400, 1100, 900]),
+                          ("table", [100, 1000, 1100, 1500])),
+            2: detections(("plain text", [100, 40, 1100, 300]), ("table", [700, 600, 1100, 900])),
+        }
+        elements = [
+            self.element("figure", 1, [100, 400, 1100, 900]),  # caption at the top of page 2
+            self.element("figure", 2, [100, 400, 1100, 900]),  # page 3 starts with text
+            self.element("table", 2, [100, 1000, 1100, 1500]),  # not aligned with page 3's table
+            self.element("table", 3, [700, 600, 1100, 900]),    # last page of the batch
+        ]
+        keep = main._may_be_stitched(elements, dets_by_page, page_count=6)
+        self.assertEqual(keep, [True, False, False, True])
+
+    def test_tables_continued_inside_the_batch_stay_in_memory(self):
+        dets_by_page = {
+            2: detections(("table", [100, 800, 1100, 1500])),
+            3: detections(("table", [100, 100, 1100, 700])),
+            4: detections(("plain text", [100, 100, 1100, 700])),
+        }
+        elements = [
+            self.element("table", 3, [100, 800, 1100, 1500]),
+            self.element("table", 4, [100, 100, 1100, 700]),
+        ]
+        links = main._table_continuation_matrix(
+            elements[:1], elements[1:], main.TABLE_STITCH_TOLERANCES
+        )
+        self.assertTrue(links.any())
+        # Page 3 borders page 2, outside the batch; page 4 is only linked from page 3
+        self.assertEqual(main._may_be_stitched(elements, dets_by_page, page_count=8), [True, True])
+
+        settled = main._may_be_stitched(elements[1:], dets_by_page, page_count=8)
+        self.assertEqual(settled, [False])
+
+
+if __name__ == '__main__':
+    unittest.main()